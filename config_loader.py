@@ -4,176 +4,212 @@ Config loader for Instagram crawler.
 Priority: .env > config.json > defaults.
 """
 
-import json
+import copy
+import functools
 import os
 from pathlib import Path
 
-from dotenv import load_dotenv
+import json_compat
 
-load_dotenv()
+_env_loaded = False
+
+
+def _ensure_env_loaded() -> None:
+    # Deferred so importing this module does not pull in python-dotenv.
+    global _env_loaded
+    if _env_loaded:
+        return
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    _env_loaded = True
+
+
+_BOOL_TRUE = frozenset({"1", "true", "yes", "on"})
+
+
+def _parse_bool(value: str) -> bool:
+    return value.lower() in _BOOL_TRUE
+
+
+def _parse_mode(value: str) -> str:
+    return value.strip().lower()
+
+
+# (env name, path under "instagram", caster)
+_ENV_OVERRIDES = (
+    # Cookie overrides
+    ("IG_SESSIONID", ("authentication", "cookies", "sessionid"), str),
+    ("IG_CSRFTOKEN", ("authentication", "cookies", "csrftoken"), str),
+    ("IG_DS_USER_ID", ("authentication", "cookies", "ds_user_id"), str),
+    ("IG_RUR", ("authentication", "cookies", "rur"), str),
+    # Header overrides
+    ("IG_X_CSRF_TOKEN", ("authentication", "headers", "X-CSRFToken"), str),
+    ("IG_X_IG_APP_ID", ("authentication", "headers", "X-IG-App-ID"), str),
+    ("IG_X_IG_WWW_CLAIM", ("authentication", "headers", "X-IG-WWW-Claim"), str),
+    ("IG_X_ASBD_ID", ("authentication", "headers", "X-ASBD-ID"), str),
+    ("IG_USER_AGENT", ("authentication", "headers", "User-Agent"), str),
+    ("IG_REFERER", ("authentication", "headers", "Referer"), str),
+    # Proxy overrides
+    ("HTTP_PROXY", ("proxy", "http"), str),
+    ("HTTPS_PROXY", ("proxy", "https"), str),
+    # Settings overrides
+    ("IG_REQUESTS_PER_MINUTE", ("settings", "requests_per_minute"), int),
+    ("IG_RETRY_ATTEMPTS", ("settings", "retry_attempts"), int),
+    ("IG_RETRY_DELAY", ("settings", "retry_delay"), int),
+    ("IG_TIMEOUT", ("settings", "timeout"), int),
+    ("IG_MAX_COMMENTS", ("settings", "max_comments"), int),
+    ("IG_FETCH_REPLIES", ("settings", "fetch_replies"), _parse_bool),
+    ("IG_RESUME_BY_DEFAULT", ("settings", "resume_by_default"), _parse_bool),
+    ("IG_COMMENTS_FIRST", ("settings", "comments_first"), int),
+    ("IG_REPLIES_FIRST", ("settings", "replies_first"), int),
+    ("IG_JITTER_RATIO", ("settings", "request_jitter_ratio"), float),
+    ("IG_SAVE_RAW_RESPONSES", ("settings", "save_raw_responses"), _parse_mode),
+    ("IG_RAW_RESPONSES_KEEP", ("settings", "raw_responses_keep"), int),
+    ("IG_RAW_RESPONSES_MAX_MB", ("settings", "raw_responses_max_mb"), int),
+)
+
+
+_DEFAULT_CONFIG = {
+    "instagram": {
+        "authentication": {
+            "cookies": {
+                "sessionid": "YOUR_SESSIONID_HERE",
+                "csrftoken": "YOUR_CSRFTOKEN_HERE",
+                "ds_user_id": "YOUR_DS_USER_ID_HERE",
+                "rur": "YOUR_RUR_HERE",
+            },
+            "headers": {
+                "X-CSRFToken": "YOUR_X_CSRF_TOKEN_HERE",
+                "X-IG-App-ID": "YOUR_X_IG_APP_ID_HERE",
+                "X-IG-WWW-Claim": "YOUR_X_IG_WWW_CLAIM_HERE",
+                "X-ASBD-ID": "YOUR_X_ASBD_ID_HERE",
+                "Referer": "https://www.instagram.com/",
+                "User-Agent": (
+                    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                    "AppleWebKit/537.36 (KHTML, like Gecko) "
+                    "Chrome/120.0.0.0 Safari/537.36"
+                ),
+            },
+        },
+        "endpoints": {
+            "post_by_shortcode": {
+                "type": "graphql",
+                "method": "POST",
+                "url": "https://www.instagram.com/api/graphql",
+                "doc_id": "YOUR_DOC_ID_HERE",
+                "variables": {
+                    "shortcode": "{shortcode}"
+                },
+            },
+            "comments": {
+                "type": "graphql",
+                "method": "POST",
+                "url": "https://www.instagram.com/api/graphql",
+                "doc_id": "YOUR_DOC_ID_HERE",
+                "variables": {
+                    "shortcode": "{shortcode}",
+                    "first": 50,
+                    "after": "{cursor}"
+                },
+            },
+            "comment_replies": {
+                "type": "graphql",
+                "method": "POST",
+                "url": "https://www.instagram.com/api/graphql",
+                "doc_id": "YOUR_DOC_ID_HERE",
+                "variables": {
+                    "comment_id": "{comment_id}",
+                    "first": 50,
+                    "after": "{cursor}"
+                },
+            },
+        },
+        "settings": {
+            "requests_per_minute": 8,
+            "retry_attempts": 3,
+            "retry_delay": 5,
+            "timeout": 30,
+            "max_comments": 400,
+            "fetch_replies": True,
+            "resume_by_default": True,
+            "resume_save_every": 5,
+            "compact_output": False,
+            "jsonl_output": False,
+            "comments_first": 20,
+            "replies_first": 20,
+            "request_jitter_ratio": 0.2,
+            "save_raw_responses": "errors",
+            "raw_responses_keep": 200,
+            "raw_responses_max_mb": 100,
+        },
+        "proxy": {
+            "http": None,
+            "https": None,
+        },
+    }
+}
+
+_DEFAULT_CONFIG_JSON = json_compat.dumps(_DEFAULT_CONFIG)
+
+
+@functools.lru_cache(maxsize=8)
+def _read_json_cached(path: str, mtime_ns: int, size: int) -> dict:
+    # mtime/size are part of the cache key so edits on disk invalidate it.
+    with open(path, "rb") as file:
+        return json_compat.loads(file.read())
+
+
+@functools.lru_cache(maxsize=128)
+def _split_key_path(key_path: str) -> tuple:
+    return tuple(key_path.split("."))
 
 
 class ConfigLoader:
     def __init__(self, config_file: str = "config.json"):
+        _ensure_env_loaded()
         self.config_file = Path(config_file)
         self.config = self._load_config()
 
     def _load_config(self):
-        config = {
-            "instagram": {
-                "authentication": {
-                    "cookies": {
-                        "sessionid": "YOUR_SESSIONID_HERE",
-                        "csrftoken": "YOUR_CSRFTOKEN_HERE",
-                        "ds_user_id": "YOUR_DS_USER_ID_HERE",
-                        "rur": "YOUR_RUR_HERE",
-                    },
-                    "headers": {
-                        "X-CSRFToken": "YOUR_X_CSRF_TOKEN_HERE",
-                        "X-IG-App-ID": "YOUR_X_IG_APP_ID_HERE",
-                        "X-IG-WWW-Claim": "YOUR_X_IG_WWW_CLAIM_HERE",
-                        "X-ASBD-ID": "YOUR_X_ASBD_ID_HERE",
-                        "Referer": "https://www.instagram.com/",
-                        "User-Agent": (
-                            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                            "AppleWebKit/537.36 (KHTML, like Gecko) "
-                            "Chrome/120.0.0.0 Safari/537.36"
-                        ),
-                    },
-                },
-                "endpoints": {
-                    "post_by_shortcode": {
-                        "type": "graphql",
-                        "method": "POST",
-                        "url": "https://www.instagram.com/api/graphql",
-                        "doc_id": "YOUR_DOC_ID_HERE",
-                        "variables": {
-                            "shortcode": "{shortcode}"
-                        },
-                    },
-                    "comments": {
-                        "type": "graphql",
-                        "method": "POST",
-                        "url": "https://www.instagram.com/api/graphql",
-                        "doc_id": "YOUR_DOC_ID_HERE",
-                        "variables": {
-                            "shortcode": "{shortcode}",
-                            "first": 50,
-                            "after": "{cursor}"
-                        },
-                    },
-                    "comment_replies": {
-                        "type": "graphql",
-                        "method": "POST",
-                        "url": "https://www.instagram.com/api/graphql",
-                        "doc_id": "YOUR_DOC_ID_HERE",
-                        "variables": {
-                            "comment_id": "{comment_id}",
-                            "first": 50,
-                            "after": "{cursor}"
-                        },
-                    },
-                },
-                "settings": {
-                    "requests_per_minute": 8,
-                    "retry_attempts": 3,
-                    "retry_delay": 5,
-                    "timeout": 30,
-                    "max_comments": 400,
-                    "fetch_replies": True,
-                    "resume_by_default": True,
-                    "comments_first": 20,
-                    "replies_first": 20,
-                    "request_jitter_ratio": 0.2,
-                    "save_raw_responses": "errors",
-                    "raw_responses_keep": 200,
-                    "raw_responses_max_mb": 100,
-                },
-                "proxy": {
-                    "http": None,
-                    "https": None,
-                },
-            }
-        }
+        # Fresh copy of the defaults; decoding the pre-encoded bytes is cheaper
+        # than rebuilding or deep-copying the nested dict.
+        config = json_compat.loads(_DEFAULT_CONFIG_JSON)
 
         if self.config_file.exists():
-            with open(self.config_file, "r", encoding="utf-8") as file:
-                json_config = json.load(file)
-                self._deep_update(config, json_config)
+            stat = self.config_file.stat()
+            json_config = _read_json_cached(str(self.config_file.resolve()), stat.st_mtime_ns, stat.st_size)
+            self._deep_update(config, copy.deepcopy(json_config))
 
         ig = config["instagram"]
-
-        # Cookie overrides
-        if os.getenv("IG_SESSIONID"):
-            ig["authentication"]["cookies"]["sessionid"] = os.getenv("IG_SESSIONID")
-        if os.getenv("IG_CSRFTOKEN"):
-            ig["authentication"]["cookies"]["csrftoken"] = os.getenv("IG_CSRFTOKEN")
-        if os.getenv("IG_DS_USER_ID"):
-            ig["authentication"]["cookies"]["ds_user_id"] = os.getenv("IG_DS_USER_ID")
-        if os.getenv("IG_RUR"):
-            ig["authentication"]["cookies"]["rur"] = os.getenv("IG_RUR")
-
-        # Header overrides
-        if os.getenv("IG_X_CSRF_TOKEN"):
-            ig["authentication"]["headers"]["X-CSRFToken"] = os.getenv("IG_X_CSRF_TOKEN")
-        if os.getenv("IG_X_IG_APP_ID"):
-            ig["authentication"]["headers"]["X-IG-App-ID"] = os.getenv("IG_X_IG_APP_ID")
-        if os.getenv("IG_X_IG_WWW_CLAIM"):
-            ig["authentication"]["headers"]["X-IG-WWW-Claim"] = os.getenv("IG_X_IG_WWW_CLAIM")
-        if os.getenv("IG_X_ASBD_ID"):
-            ig["authentication"]["headers"]["X-ASBD-ID"] = os.getenv("IG_X_ASBD_ID")
-        if os.getenv("IG_USER_AGENT"):
-            ig["authentication"]["headers"]["User-Agent"] = os.getenv("IG_USER_AGENT")
-        if os.getenv("IG_REFERER"):
-            ig["authentication"]["headers"]["Referer"] = os.getenv("IG_REFERER")
-
-        # Proxy overrides
-        if os.getenv("HTTP_PROXY"):
-            ig["proxy"]["http"] = os.getenv("HTTP_PROXY")
-        if os.getenv("HTTPS_PROXY"):
-            ig["proxy"]["https"] = os.getenv("HTTPS_PROXY")
-
-        # Settings overrides
-        if os.getenv("IG_REQUESTS_PER_MINUTE"):
-            ig["settings"]["requests_per_minute"] = int(os.getenv("IG_REQUESTS_PER_MINUTE"))
-        if os.getenv("IG_RETRY_ATTEMPTS"):
-            ig["settings"]["retry_attempts"] = int(os.getenv("IG_RETRY_ATTEMPTS"))
-        if os.getenv("IG_RETRY_DELAY"):
-            ig["settings"]["retry_delay"] = int(os.getenv("IG_RETRY_DELAY"))
-        if os.getenv("IG_TIMEOUT"):
-            ig["settings"]["timeout"] = int(os.getenv("IG_TIMEOUT"))
-        if os.getenv("IG_MAX_COMMENTS"):
-            ig["settings"]["max_comments"] = int(os.getenv("IG_MAX_COMMENTS"))
-        if os.getenv("IG_FETCH_REPLIES"):
-            ig["settings"]["fetch_replies"] = os.getenv("IG_FETCH_REPLIES").lower() in {"1", "true", "yes", "on"}
-        if os.getenv("IG_RESUME_BY_DEFAULT"):
-            ig["settings"]["resume_by_default"] = os.getenv("IG_RESUME_BY_DEFAULT").lower() in {"1", "true", "yes", "on"}
-        if os.getenv("IG_COMMENTS_FIRST"):
-            ig["settings"]["comments_first"] = int(os.getenv("IG_COMMENTS_FIRST"))
-        if os.getenv("IG_REPLIES_FIRST"):
-            ig["settings"]["replies_first"] = int(os.getenv("IG_REPLIES_FIRST"))
-        if os.getenv("IG_JITTER_RATIO"):
-            ig["settings"]["request_jitter_ratio"] = float(os.getenv("IG_JITTER_RATIO"))
-        if os.getenv("IG_SAVE_RAW_RESPONSES"):
-            ig["settings"]["save_raw_responses"] = os.getenv("IG_SAVE_RAW_RESPONSES").strip().lower()
-        if os.getenv("IG_RAW_RESPONSES_KEEP"):
-            ig["settings"]["raw_responses_keep"] = int(os.getenv("IG_RAW_RESPONSES_KEEP"))
-        if os.getenv("IG_RAW_RESPONSES_MAX_MB"):
-            ig["settings"]["raw_responses_max_mb"] = int(os.getenv("IG_RAW_RESPONSES_MAX_MB"))
+        env = os.environ
+        for name, path, cast in _ENV_OVERRIDES:
+            value = env.get(name)
+            if not value:
+                continue
+            target = ig
+            for key in path[:-1]:
+                target = target[key]
+            target[path[-1]] = cast(value)
 
         return config
 
     def _deep_update(self, base, update):
-        for key, value in update.items():
-            if key in base and isinstance(base[key], dict) and isinstance(value, dict):
-                self._deep_update(base[key], value)
-            else:
-                base[key] = value
+        stack = [(base, update)]
+        while stack:
+            base_dict, update_dict = stack.pop()
+            for key, value in update_dict.items():
+                base_value = base_dict.get(key)
+                if isinstance(base_value, dict) and isinstance(value, dict):
+                    stack.append((base_value, value))
+                else:
+                    base_dict[key] = value
 
     def get(self, key_path, default=None):
-        keys = key_path.split(".")
+        if "." not in key_path:
+            return self.config.get(key_path, default)
         value = self.config
-        for key in keys:
+        for key in _split_key_path(key_path):
             if isinstance(value, dict) and key in value:
                 value = value[key]
             else:
@@ -181,11 +217,15 @@ class ConfigLoader:
         return value
 
     def save_to_json(self, output_file=None):
-        output_file = output_file or self.config_file
-        with open(output_file, "w", encoding="utf-8") as file:
-            json.dump(self.config, file, ensure_ascii=False, indent=2)
+        output_file = Path(output_file or self.config_file)
+        output_file.write_bytes(json_compat.dumps(self.config, indent=True))
+        self.invalidate_cache()
         print(f"Config saved: {output_file}")
 
+    @staticmethod
+    def invalidate_cache():
+        _read_json_cached.cache_clear()
+
     def get_proxy_settings(self):
         proxy = self.config.get("instagram", {}).get("proxy", {})
         if proxy.get("http") or proxy.get("https"):
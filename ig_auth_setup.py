@@ -6,63 +6,106 @@ Logs in via Playwright, captures cookies + headers + endpoints from network.
 
 import argparse
 import asyncio
-import json
+import contextlib
+import functools
 import os
 import re
+import signal
 import time
 from pathlib import Path
-from urllib.parse import parse_qs, urlparse
-
-from playwright.async_api import async_playwright
+from urllib.parse import parse_qs
 
+import json_compat
 from config_loader import ConfigLoader
 
 
-HEADER_KEYS = {
-    "x-csrftoken": "X-CSRFToken",
-    "x-ig-app-id": "X-IG-App-ID",
-    "x-ig-www-claim": "X-IG-WWW-Claim",
-    "x-asbd-id": "X-ASBD-ID",
-    "referer": "Referer",
-    "user-agent": "User-Agent",
-}
+# (lower-case request header, config.json header name)
+HEADER_KEYS = (
+    ("x-csrftoken", "X-CSRFToken"),
+    ("x-ig-app-id", "X-IG-App-ID"),
+    ("x-ig-www-claim", "X-IG-WWW-Claim"),
+    ("x-asbd-id", "X-ASBD-ID"),
+    ("referer", "Referer"),
+    ("user-agent", "User-Agent"),
+)
+
+
+_SHORTCODE_RE = re.compile(r"instagram\.com/(?:p|reel|tv)/([A-Za-z0-9_-]+)")
 
 
 def extract_shortcode_from_url(url: str) -> str | None:
-    match = re.search(r"instagram\.com/(p|reel|tv)/([^/?#]+)/?", url)
+    match = _SHORTCODE_RE.search(url)
     if not match:
         return None
-    return match.group(2)
+    return match.group(1)
 
 
 def normalize_headers(headers: dict) -> dict:
-    normalized = {}
-    for key, value in headers.items():
-        lower = key.lower()
-        if lower in HEADER_KEYS and value:
-            normalized[HEADER_KEYS[lower]] = value
-    return normalized
+    # Playwright exposes request headers with lower-case names.
+    return {pretty: value for lower, pretty in HEADER_KEYS if (value := headers.get(lower))}
+
+
+_API_RESOURCE_TYPES = frozenset({"xhr", "fetch", "document"})
+
+
+def is_api_request(request) -> bool:
+    # Cheap checks only: static assets and page loads never carry endpoint payloads.
+    if request.resource_type not in _API_RESOURCE_TYPES:
+        return False
+    url = request.url
+    if "/api/" not in url and "/graphql" not in url:
+        return False
+    # GraphQL queries are POSTs; a GET only matters if it names a query.
+    if request.method.upper() == "GET" and "doc_id" not in url and "query_hash" not in url:
+        return False
+    return True
+
+
+_CANDIDATE_KEYS = ("doc_id", "query_hash", "variables", "fb_api_req_friendly_name")
+_LOG_RESOURCE_TYPES = frozenset({"xhr", "fetch"})
+
+
+def is_candidate_payload(payload: dict) -> bool:
+    return any(key in payload for key in _CANDIDATE_KEYS)
+
+
+def parse_query_string(query: str) -> dict:
+    # Plain "k=v&k2=v2" needs no unquoting; leave encoded queries to parse_qs.
+    if "%" in query or "+" in query:
+        return {k: v[0] for k, v in parse_qs(query).items()}
+    params = {}
+    for pair in query.split("&"):
+        key, _, value = pair.partition("=")
+        # Like parse_qs: blank values are dropped, empty keys are kept.
+        if value:
+            params.setdefault(key, value)
+    return params
 
 
 def parse_request_payload(request) -> dict:
     if request.method.upper() == "GET":
-        parsed = urlparse(request.url)
-        return {k: v[0] for k, v in parse_qs(parsed.query).items()}
-
-    if not request.post_data:
+        url = request.url
+        query_start = url.find("?")
+        if query_start < 0:
+            return {}
+        return parse_query_string(url[query_start + 1:].split("#", 1)[0])
+
+    post_data = request.post_data
+    if not post_data:
         return {}
 
-    # Try JSON first
-    try:
-        json_payload = request.post_data_json()
-        if isinstance(json_payload, dict):
-            return json_payload
-    except Exception:
-        pass
+    # Only attempt JSON when the body looks like it; a failed parse is costly.
+    if post_data.lstrip()[:1] == "{":
+        try:
+            json_payload = json_compat.loads(post_data)
+            if isinstance(json_payload, dict):
+                return json_payload
+        except Exception:
+            pass
 
     # Fallback to querystring
     try:
-        return {k: v[0] for k, v in parse_qs(request.post_data).items()}
+        return parse_query_string(post_data)
     except Exception:
         return {}
 
@@ -86,48 +129,63 @@ def render_variables_template(variables: dict, known: dict) -> dict:
     return template
 
 
-def classify_endpoint(payload: dict, url: str) -> str | None:
-    variables = payload.get("variables")
-    if isinstance(variables, str):
-        try:
-            variables = json.loads(variables)
-        except Exception:
-            variables = None
+# "repl" also covers "reply"/"replies". The lookahead makes matches overlap, so
+# one token cannot hide another ("storieshortcode" yields both).
+_FRIENDLY_TOKEN_RE = re.compile(r"(?=(comment|repl|child|shortcode|media|timeline|feed|stories))")
+_SKIP_TOKENS = frozenset({"timeline", "feed", "stories"})
 
-    friendly_name = payload.get("fb_api_req_friendly_name") or payload.get("friendly_name")
-    friendly_lower = friendly_name.lower() if isinstance(friendly_name, str) else ""
-    if friendly_lower:
-        if "comment" in friendly_lower:
-            if "reply" in friendly_lower or "repl" in friendly_lower or "child" in friendly_lower:
+
+@functools.lru_cache(maxsize=512)
+def _classify_from_key(friendly_name: str, var_keys: frozenset, url_has_comment: bool) -> str | None:
+    if friendly_name:
+        tokens = set(_FRIENDLY_TOKEN_RE.findall(friendly_name.lower()))
+        if "comment" in tokens:
+            if "repl" in tokens or "child" in tokens:
                 return "comment_replies"
             return "comments"
-        if "shortcode" in friendly_lower or "media" in friendly_lower:
+        if "shortcode" in tokens or "media" in tokens:
             return "post_by_shortcode"
-        if "timeline" in friendly_lower or "feed" in friendly_lower or "stories" in friendly_lower:
+        if tokens & _SKIP_TOKENS:
             return None
 
-    if isinstance(variables, dict):
-        if "comment_id" in variables or "parent_comment_id" in variables:
-            return "comment_replies"
-        if "shortcode" in variables or "short_code" in variables:
-            return "post_by_shortcode"
-        if "media_id" in variables and "first" in variables:
-            return "comments"
-        if "first" in variables and ("after" in variables or "cursor" in variables):
-            return "comments"
+    if "comment_id" in var_keys or "parent_comment_id" in var_keys:
+        return "comment_replies"
+    if "shortcode" in var_keys or "short_code" in var_keys:
+        return "post_by_shortcode"
+    if "media_id" in var_keys and "first" in var_keys:
+        return "comments"
+    if "first" in var_keys and ("after" in var_keys or "cursor" in var_keys):
+        return "comments"
 
-    if "comment" in url:
+    if url_has_comment:
         return "comments"
 
     return None
 
 
+def classify_endpoint(payload: dict, url: str) -> str | None:
+    variables = payload.get("variables")
+    if isinstance(variables, str):
+        try:
+            variables = json_compat.loads(variables)
+        except Exception:
+            variables = None
+
+    # Only the friendly name, variable names and URL matter, so repeated
+    # requests to the same endpoint hit the cache.
+    friendly_name = payload.get("fb_api_req_friendly_name") or payload.get("friendly_name")
+    if not isinstance(friendly_name, str):
+        friendly_name = ""
+    var_keys = frozenset(variables) if isinstance(variables, dict) else frozenset()
+    return _classify_from_key(friendly_name, var_keys, "comment" in url)
+
+
 def build_endpoint_config(request, known: dict) -> dict:
     payload = parse_request_payload(request)
     variables = payload.get("variables")
     if isinstance(variables, str):
         try:
-            variables = json.loads(variables)
+            variables = json_compat.loads(variables)
         except Exception:
             variables = None
 
@@ -159,19 +217,20 @@ def build_endpoint_config(request, known: dict) -> dict:
 
 def update_env_file(env_path: Path, updates: dict) -> None:
     if not env_path.exists():
-        content = ""
+        lines = []
     else:
-        content = env_path.read_text(encoding="utf-8")
+        lines = env_path.read_text(encoding="utf-8").splitlines()
 
-    for key, value in updates.items():
-        pattern = rf"^{re.escape(key)}=.*$"
-        replacement = f"{key}={value}"
-        if re.search(pattern, content, flags=re.MULTILINE):
-            content = re.sub(pattern, replacement, content, flags=re.MULTILINE)
-        else:
-            content += f"\n{replacement}"
+    # Single pass over the file: rewrite known keys, append the rest.
+    remaining = dict(updates)
+    for index, line in enumerate(lines):
+        key, sep, _ = line.partition("=")
+        if sep and key in updates:
+            lines[index] = f"{key}={updates[key]}"
+            remaining.pop(key, None)
+    lines.extend(f"{key}={value}" for key, value in remaining.items())
 
-    env_path.write_text(content.strip() + "\n", encoding="utf-8")
+    env_path.write_text("\n".join(lines).strip() + "\n", encoding="utf-8")
 
 
 async def main() -> int:
@@ -180,19 +239,37 @@ async def main() -> int:
     parser.add_argument("--config", default="config.json", help="Config file path")
     args = parser.parse_args()
 
+    from playwright.async_api import async_playwright
+
     post_url = args.post_url
     shortcode = extract_shortcode_from_url(post_url) if post_url else None
 
     user_data_dir = Path(__file__).parent / "browser_data"
     config_path = Path(args.config)
+    loader = ConfigLoader(config_file=config_path)
 
     captured_headers = {}
     captured_endpoints = {}
-    capture_log = []
+    friendly_names: set[str] = set()
     request_count = 0
     candidate_count = 0
-
-    async with async_playwright() as p:
+    logged_count = 0
+
+    # Same modes as IGCrawler.save_raw_response: off, errors only, or everything.
+    save_mode = str(loader.get("instagram.settings.save_raw_responses", "errors") or "errors").lower()
+    log_errors = save_mode in {"errors", "error"}
+    log_all = not log_errors and save_mode not in {"none", "off", "false", "0"}
+
+    # Stream the capture log to disk (NDJSON) instead of buffering it in memory.
+    capture_dir = Path(__file__).parent / "crawler_data" / "raw_responses"
+    timestamp = time.strftime("%Y%m%d_%H%M%S", time.gmtime())
+    capture_path = capture_dir / f"ig_auth_capture_{timestamp}.ndjson"
+    log_fh = None
+
+    # The capture log is opened on the first entry and closed by log_cleanup
+    # only after Playwright has stopped, so no handler can write to it once
+    # closed, including when the launch or navigation fails.
+    async with contextlib.AsyncExitStack() as log_cleanup, async_playwright() as p:
         context = await p.chromium.launch_persistent_context(
             user_data_dir=str(user_data_dir),
             headless=False,
@@ -201,15 +278,34 @@ async def main() -> int:
 
         page = context.pages[0] if context.pages else await context.new_page()
 
+        def write_log(request, payload, endpoint_type, headers, status=None):
+            nonlocal logged_count, log_fh
+            if log_fh is None:
+                capture_dir.mkdir(parents=True, exist_ok=True)
+                log_fh = log_cleanup.enter_context(open(capture_path, "ab", buffering=1 << 20))
+            logged_count += 1
+            item = {
+                "timestamp": time.time(),
+                "url": request.url,
+                "method": request.method,
+                "resource_type": request.resource_type,
+                "endpoint_type": endpoint_type,
+                "payload_keys": list(payload.keys()),
+                "payload": payload,
+                "headers": headers,
+            }
+            if status is not None:
+                item["status"] = status
+            log_fh.write(json_compat.dumps(item) + b"\n")
+
         def handle_request(request):
             if "instagram.com" not in request.url:
                 return
             nonlocal request_count, candidate_count
             request_count += 1
 
-            payload = parse_request_payload(request)
-            payload_keys = list(payload.keys()) if isinstance(payload, dict) else []
-            is_candidate = any(key in payload_keys for key in ["doc_id", "query_hash", "variables", "fb_api_req_friendly_name"])
+            payload = parse_request_payload(request) if is_api_request(request) else {}
+            is_candidate = is_candidate_payload(payload)
             if is_candidate:
                 candidate_count += 1
 
@@ -223,23 +319,28 @@ async def main() -> int:
                 captured_endpoints[endpoint_type] = build_endpoint_config(request, {"shortcode": shortcode})
                 print(f"Captured endpoint: {endpoint_type}")
 
-            # Log every Instagram XHR/Fetch request for debugging
-            if request.resource_type in {"xhr", "fetch"}:
-                capture_log.append({
-                    "timestamp": time.time(),
-                    "url": request.url,
-                    "method": request.method,
-                    "resource_type": request.resource_type,
-                    "endpoint_type": endpoint_type,
-                    "payload_keys": payload_keys,
-                    "payload": payload,
-                    "headers": {
-                        k: v for k, v in request.headers.items()
-                        if k.lower() in {"x-csrftoken", "x-ig-app-id", "x-ig-www-claim", "x-asbd-id", "referer", "user-agent"}
-                    },
-                })
+            if request.resource_type in _LOG_RESOURCE_TYPES:
+                friendly_name = payload.get("fb_api_req_friendly_name")
+                if friendly_name:
+                    friendly_names.add(friendly_name)
+                # Log every Instagram XHR/Fetch request for debugging
+                if log_all:
+                    write_log(request, payload, endpoint_type, headers)
+
+        def handle_response(response):
+            # Errors-only mode: log failed XHR/Fetch requests once their status is known.
+            if response.status < 400:
+                return
+            request = response.request
+            if "instagram.com" not in request.url or request.resource_type not in _LOG_RESOURCE_TYPES:
+                return
+            payload = parse_request_payload(request) if is_api_request(request) else {}
+            endpoint_type = classify_endpoint(payload, request.url) if is_candidate_payload(payload) else None
+            write_log(request, payload, endpoint_type, normalize_headers(request.headers), status=response.status)
 
         page.on("request", handle_request)
+        if log_errors:
+            page.on("response", handle_response)
 
         if post_url:
             await page.goto(post_url)
@@ -252,17 +353,26 @@ async def main() -> int:
         print("3) Scroll comments so comment requests fire")
         print("4) Wait for capture logs, then press Ctrl+C")
 
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
         try:
-            while True:
-                await asyncio.sleep(1)
-        except KeyboardInterrupt:
+            loop.add_signal_handler(signal.SIGINT, stop_event.set)
+            handles_sigint = True
+        except (NotImplementedError, RuntimeError):
+            # Windows event loops do not support signal handlers; rely on KeyboardInterrupt.
+            handles_sigint = False
+
+        try:
+            await stop_event.wait()
+        except (KeyboardInterrupt, asyncio.CancelledError):
             pass
         finally:
+            if handles_sigint:
+                loop.remove_signal_handler(signal.SIGINT)
             # Capture cookies
             cookies = await context.cookies()
             cookie_map = {c["name"]: c["value"] for c in cookies}
 
-            loader = ConfigLoader(config_file=config_path)
             config = loader.config
             ig = config.get("instagram", {})
 
@@ -304,26 +414,19 @@ async def main() -> int:
             env_path = Path(__file__).parent / ".env"
             update_env_file(env_path, env_updates)
 
-            # Save capture log for debugging
-            if capture_log:
-                capture_dir = Path(__file__).parent / "crawler_data" / "raw_responses"
-                capture_dir.mkdir(parents=True, exist_ok=True)
-                timestamp = time.strftime("%Y%m%d_%H%M%S", time.gmtime())
-                capture_path = capture_dir / f"ig_auth_capture_{timestamp}.json"
-                capture_path.write_text(json.dumps(capture_log, ensure_ascii=False, indent=2), encoding="utf-8")
+            # Stop logging before the context shuts down.
+            page.remove_listener("request", handle_request)
+            if log_errors:
+                page.remove_listener("response", handle_response)
+            if logged_count:
                 print(f"Saved capture log: {capture_path}")
-                friendly_names = sorted({
-                    item.get("payload", {}).get("fb_api_req_friendly_name")
-                    for item in capture_log
-                    if item.get("payload", {}).get("fb_api_req_friendly_name")
-                })
-                if friendly_names:
-                    print("Captured friendly names:")
-                    for name in friendly_names:
-                        print(f"  - {name}")
             else:
-                print(f"No XHR/Fetch requests captured. Total requests seen: {request_count}")
+                print(f"No XHR/Fetch requests logged (save_raw_responses={save_mode}). Total requests seen: {request_count}")
                 print(f"Candidate requests seen: {candidate_count}")
+            if friendly_names:
+                print("Captured friendly names:")
+                for name in sorted(friendly_names):
+                    print(f"  - {name}")
 
             await context.close()
 
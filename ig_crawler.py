@@ -3,40 +3,66 @@
 Instagram single-post comments crawler.
 """
 
-import json
+import functools
 import os
 import random
 import re
 import time
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 from urllib.parse import urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
 
+import json_compat
 from config_loader import ConfigLoader
 
 
+# Shortcodes use the same URL-safe alphabet as _SHORTCODE_DIGITS.
+_SHORTCODE_RE = re.compile(r"instagram\.com/(?:p|reel|tv)/([A-Za-z0-9_-]+)")
+_PLACEHOLDER_RE = re.compile(r"\{([a-zA-Z0-9_]+)\}")
+
+
+@functools.lru_cache(maxsize=256)
+def html_media_id_pattern(shortcode: str) -> "re.Pattern[bytes]":
+    # One alternation so the page is scanned once: "media_id":"N", or an
+    # "id"/"pk" immediately followed by this shortcode.
+    escaped = re.escape(shortcode.encode("utf-8"))
+    return re.compile(rb'"media_id":"(\d+)"|"(?:id|pk)":"(\d+)","shortcode":"' + escaped + rb'"')
+
+
 def extract_shortcode(post_url: str) -> Optional[str]:
-    match = re.search(r"instagram\.com/(p|reel|tv)/([^/?#]+)/?", post_url)
+    match = _SHORTCODE_RE.search(post_url)
     if not match:
         return None
-    return match.group(2)
+    return match.group(1)
+
+
+# Byte -> base64url digit; 0xFF marks characters outside the alphabet.
+_SHORTCODE_DIGITS = bytearray(b"\xff" * 256)
+for _index, _char in enumerate(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"):
+    _SHORTCODE_DIGITS[_char] = _index
+del _index, _char
 
 
 def shortcode_to_media_id(shortcode: str) -> Optional[str]:
-    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
-    media_id = 0
     try:
-        for char in shortcode:
-            media_id = media_id * 64 + alphabet.index(char)
-    except ValueError:
+        raw = shortcode.encode("ascii")
+    except UnicodeEncodeError:
         return None
+    digits = _SHORTCODE_DIGITS
+    media_id = 0
+    for byte in raw:
+        digit = digits[byte]
+        if digit == 0xFF:
+            return None
+        media_id = (media_id << 6) | digit
     return str(media_id)
 
 
-def deep_get(data: Any, path: List[Any]) -> Any:
+def deep_get(data: Any, path: Sequence[Any]) -> Any:
     cur = data
     for key in path:
         if isinstance(cur, dict) and key in cur:
@@ -49,18 +75,30 @@ def deep_get(data: Any, path: List[Any]) -> Any:
     return cur
 
 
+class _UnresolvedPlaceholder(Exception):
+    pass
+
+
+def render_string(value: str, variables: Dict[str, Any]) -> Optional[str]:
+    if "{" not in value:
+        return value
+
+    def replace(match: "re.Match[str]") -> str:
+        replacement = variables.get(match.group(1))
+        if replacement is None:
+            # unknown or None placeholder: drop the whole value
+            raise _UnresolvedPlaceholder
+        return str(replacement)
+
+    try:
+        return _PLACEHOLDER_RE.sub(replace, value)
+    except _UnresolvedPlaceholder:
+        return None
+
+
 def render_template(value: Any, variables: Dict[str, Any]) -> Any:
     if isinstance(value, str):
-        for key, replacement in variables.items():
-            placeholder = "{" + key + "}"
-            if placeholder in value:
-                if replacement is None:
-                    return None
-                value = value.replace(placeholder, str(replacement))
-        if re.search(r"\{[a-zA-Z0-9_]+\}", value):
-            # unresolved placeholder remains
-            return None
-        return value
+        return render_string(value, variables)
     if isinstance(value, dict):
         rendered = {}
         for k, v in value.items():
@@ -78,7 +116,58 @@ def render_template(value: Any, variables: Dict[str, Any]) -> Any:
     return value
 
 
-def pick_first_path(data: dict, paths: List[List[str]]) -> Any:
+def _compile_value(value: Any) -> Tuple[bool, Any]:
+    # (True, renderer) when the value references placeholders, else
+    # (False, value rendered once up front).
+    if isinstance(value, str):
+        if "{" in value and _PLACEHOLDER_RE.search(value):
+            return True, functools.partial(render_string, value)
+        return False, value
+    if isinstance(value, dict):
+        entries = [(k,) + _compile_value(v) for k, v in value.items()]
+        if not any(dynamic for _, dynamic, _ in entries):
+            return False, {k: v for k, _, v in entries if v is not None}
+
+        def render_dict(variables: Dict[str, Any]) -> dict:
+            rendered = {}
+            for k, dynamic, v in entries:
+                if dynamic:
+                    v = v(variables)
+                if v is not None:
+                    rendered[k] = v
+            return rendered
+        return True, render_dict
+    if isinstance(value, list):
+        items = [_compile_value(item) for item in value]
+        if not any(dynamic for dynamic, _ in items):
+            return False, [v for _, v in items if v is not None]
+
+        def render_list(variables: Dict[str, Any]) -> list:
+            rendered_list = []
+            for dynamic, v in items:
+                if dynamic:
+                    v = v(variables)
+                if v is not None:
+                    rendered_list.append(v)
+            return rendered_list
+        return True, render_list
+    return False, value
+
+
+def compile_template(value: Any) -> Callable[[Dict[str, Any]], Any]:
+    # Same result as render_template(value, variables), but constant parts are
+    # rendered once here. The top-level dict/list is still fresh per call.
+    dynamic, compiled = _compile_value(value)
+    if dynamic:
+        return compiled
+    if isinstance(compiled, dict):
+        return lambda variables: dict(compiled)
+    if isinstance(compiled, list):
+        return lambda variables: list(compiled)
+    return lambda variables: compiled
+
+
+def pick_first_path(data: Any, paths: Sequence[Sequence[Any]]) -> Any:
     for path in paths:
         value = deep_get(data, path)
         if value is not None:
@@ -86,6 +175,52 @@ def pick_first_path(data: dict, paths: List[List[str]]) -> Any:
     return None
 
 
+# Candidate connection paths, relative to payload["data"].
+COMMENT_CONNECTION_PATHS = (
+    ("xdt_api__v1__media__media_id__comments__connection",),
+    ("xdt_shortcode_media", "edge_media_to_parent_comment"),
+    ("shortcode_media", "edge_media_to_parent_comment"),
+    ("xdt_shortcode_media", "edge_media_to_comment"),
+    ("shortcode_media", "edge_media_to_comment"),
+)
+
+REPLY_CONNECTION_PATHS = (
+    ("comment", "edge_threaded_comments"),
+    ("comment", "edge_media_to_parent_comment"),
+    ("comment", "edge_media_to_comment"),
+)
+
+
+# Post field paths, relative to payload["data"].
+MEDIA_ID_PATHS = (
+    ("xdt_shortcode_media", "id"),
+    ("shortcode_media", "id"),
+    ("xdt_shortcode_media", "pk"),
+    ("shortcode_media", "pk"),
+    ("media", "id"),
+    ("media", "pk"),
+)
+
+OWNER_ID_PATHS = (
+    ("xdt_shortcode_media", "owner", "id"),
+    ("shortcode_media", "owner", "id"),
+)
+
+CAPTION_PATHS = (
+    ("xdt_shortcode_media", "edge_media_to_caption", "edges", 0, "node", "text"),
+    ("shortcode_media", "edge_media_to_caption", "edges", 0, "node", "text"),
+)
+
+TAKEN_AT_PATHS = (
+    ("xdt_shortcode_media", "taken_at_timestamp"),
+    ("shortcode_media", "taken_at_timestamp"),
+)
+
+
+def connection_parts(connection: dict) -> Tuple[List[dict], dict, Optional[int]]:
+    return connection.get("edges", []), connection.get("page_info", {}), connection.get("count")
+
+
 def find_connection_in_data(payload: dict, suffixes: List[str]) -> Optional[dict]:
     data = payload.get("data")
     if not isinstance(data, dict):
@@ -99,63 +234,139 @@ def find_connection_in_data(payload: dict, suffixes: List[str]) -> Optional[dict
     return None
 
 
+def utc_now_iso() -> str:
+    # Same shape as the old utcnow().isoformat() + "Z", without the deprecated call.
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
 def parse_timestamp(value: Any) -> Optional[str]:
     if value is None:
         return None
-    if isinstance(value, (int, float)):
-        return datetime.utcfromtimestamp(value).isoformat() + "Z"
+    if isinstance(value, int) or (isinstance(value, float) and value.is_integer()):
+        tm = time.gmtime(value)
+        return "%04d-%02d-%02dT%02d:%02d:%02dZ" % tm[:6]
+    if isinstance(value, float):
+        # Keep the microsecond suffix for fractional timestamps.
+        return datetime.fromtimestamp(value, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
     if isinstance(value, str):
         return value
     return None
 
 
-def extract_gif_url(node: dict) -> Optional[str]:
-    info = node.get("giphy_media_info")
-    if not isinstance(info, dict):
+GIF_PREFERRED_KEYS = ("original", "fixed_width", "fixed_height", "downsized", "preview_gif")
+
+
+def _gif_pick_url(images: Any) -> Optional[str]:
+    if not isinstance(images, dict):
         return None
+    for key in GIF_PREFERRED_KEYS:
+        entry = images.get(key)
+        if isinstance(entry, dict):
+            url = entry.get("url") or entry.get("mp4")
+            if url:
+                return url
+    for entry in images.values():
+        if isinstance(entry, dict):
+            url = entry.get("url") or entry.get("mp4")
+            if url:
+                return url
+    return None
 
-    def pick_url(images: Any) -> Optional[str]:
-        if not isinstance(images, dict):
-            return None
-        for key in ["original", "fixed_width", "fixed_height", "downsized", "preview_gif"]:
-            entry = images.get(key)
-            if isinstance(entry, dict):
-                url = entry.get("url") or entry.get("mp4")
-                if url:
-                    return url
-        for entry in images.values():
-            if isinstance(entry, dict):
-                url = entry.get("url") or entry.get("mp4")
-                if url:
-                    return url
+
+def gif_url_from_info(info: Any) -> Optional[str]:
+    if not isinstance(info, dict):
         return None
 
     if isinstance(info.get("url"), str):
         return info.get("url")
 
     # Prefer first-party proxied URLs when present.
-    proxy_images = info.get("first_party_cdn_proxied_images")
-    url = pick_url(proxy_images)
+    url = _gif_pick_url(info.get("first_party_cdn_proxied_images"))
     if url:
         return url
 
     # Fall back to giphy images.
-    images = info.get("images")
-    url = pick_url(images)
-    if url:
-        return url
-    return None
+    return _gif_pick_url(info.get("images"))
+
+
+def extract_gif_url(node: dict) -> Optional[str]:
+    return gif_url_from_info(node.get("giphy_media_info"))
+
+
+def seen_ids_from_comments(comments: List[dict]) -> set:
+    # Every id the crawl deduplicates against: top-level comments and replies.
+    seen = set()
+    for comment in comments:
+        seen.add(comment.get("id"))
+        for reply in comment.get("replies") or ():
+            seen.add(reply.get("id"))
+    return seen
+
+
+def comment_node_id(node: dict) -> Optional[str]:
+    comment_id = node.get("id") or node.get("pk")
+    return str(comment_id) if comment_id is not None else None
+
+
+ENDPOINT_NAMES = ("post_by_shortcode", "comments", "comment_replies")
+
+
+def configured_endpoint(endpoint: Any) -> Optional[dict]:
+    if not endpoint or str(endpoint.get("doc_id", "")).startswith("YOUR_"):
+        return None
+    return endpoint
 
 
 class IGCrawler:
-    def __init__(self, data_dir: str = "crawler_data", config_file: str = "config.json"):
-        self.data_dir = Path(os.getenv("DATA_DIR", data_dir))
-        (self.data_dir / "ig_comments").mkdir(parents=True, exist_ok=True)
-        (self.data_dir / "raw_responses").mkdir(parents=True, exist_ok=True)
+    # Fixed attribute set: no per-instance __dict__. Subclass to add attributes
+    # or to override methods per instance.
+    __slots__ = (
+        "config_loader",
+        "config",
+        "data_dir",
+        "_comments_dir",
+        "_raw_dir",
+        "requests_per_minute",
+        "retry_attempts",
+        "retry_delay",
+        "timeout",
+        "max_comments",
+        "fetch_replies",
+        "resume_by_default",
+        "resume_save_every",
+        "compact_output",
+        "jsonl_output",
+        "comments_first",
+        "replies_first",
+        "request_jitter_ratio",
+        "save_raw_mode",
+        "raw_keep",
+        "raw_max_mb",
+        "page_retry_attempts",
+        "page_retry_delay",
+        "endpoints",
+        "_variable_renderers",
+        "session",
+        "_next_ok",
+        "_rate_key",
+        "_min_interval",
+        "_jitter_max",
+        "_resume_written",
+        "_resume_saved_key",
+        "_resume_file_cache",
+    )
 
+    def __init__(self, data_dir: str = "crawler_data", config_file: str = "config.json"):
+        # Load config first: it also loads .env, which may set DATA_DIR.
         self.config_loader = ConfigLoader(config_file)
         self.config = self.config_loader.config.get("instagram", {})
 
+        self.data_dir = Path(os.getenv("DATA_DIR", data_dir))
+        self._comments_dir = self.data_dir / "ig_comments"
+        self._raw_dir = self.data_dir / "raw_responses"
+        self._comments_dir.mkdir(parents=True, exist_ok=True)
+        self._raw_dir.mkdir(parents=True, exist_ok=True)
+
         settings = self.config.get("settings", {})
         self.requests_per_minute = settings.get("requests_per_minute", 6)
         self.retry_attempts = settings.get("retry_attempts", 3)
@@ -164,6 +375,10 @@ class IGCrawler:
         self.max_comments = settings.get("max_comments", 400)
         self.fetch_replies = settings.get("fetch_replies", True)
         self.resume_by_default = settings.get("resume_by_default", True)
+        self.compact_output = settings.get("compact_output", False)
+        self.jsonl_output = settings.get("jsonl_output", False)
+        # Persist resume state every N pages (and always when the crawl stops).
+        self.resume_save_every = max(1, int(settings.get("resume_save_every", 5) or 1))
         self.comments_first = settings.get("comments_first", 20)
         self.replies_first = settings.get("replies_first", 20)
         self.request_jitter_ratio = settings.get("request_jitter_ratio", 0.2)
@@ -173,12 +388,34 @@ class IGCrawler:
         self.page_retry_attempts = settings.get("page_retry_attempts", 2)
         self.page_retry_delay = settings.get("page_retry_delay", 3.0)
 
+        # Endpoint configs resolved once; None when missing or still a placeholder.
+        endpoints = self.config.get("endpoints", {})
+        self.endpoints = {name: configured_endpoint(endpoints.get(name)) for name in ENDPOINT_NAMES}
+        # Compiled variables templates: name -> (endpoint, renderer).
+        self._variable_renderers: Dict[str, Tuple[dict, Callable[[Dict[str, Any]], Any]]] = {}
+
         self.session = requests.Session()
-        self._last_request_ts = 0.0
+        # Monotonic time before which the next request must not start.
+        self._next_ok = 0.0
+        self._rate_key = None
+        self._min_interval = 0.0
+        self._jitter_max = 0.0
+        # (comments, bytes) committed to each shortcode's resume sidecar.
+        self._resume_written: Dict[str, Tuple[int, int]] = {}
+        # Last saved (cursor, last_cursor, comment count, page, ...) per shortcode.
+        self._resume_saved_key: Dict[str, tuple] = {}
+        # shortcode -> (metadata, metadata temp, sidecar) as plain string paths.
+        self._resume_file_cache: Dict[str, Tuple[str, str, str]] = {}
 
         self.setup_session()
 
     def setup_session(self) -> None:
+        # Keep-alive pool for www.instagram.com and its CDN/API hosts. Retries
+        # stay in request_with_retry so rate limiting applies to each attempt.
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
         headers = self.config.get("authentication", {}).get("headers", {})
         self.session.headers.update({
             "Accept": "*/*",
@@ -198,17 +435,22 @@ class IGCrawler:
             self.session.proxies = proxy_settings
 
     def rate_limit_check(self) -> None:
-        if not self.requests_per_minute or self.requests_per_minute <= 0:
+        rpm = self.requests_per_minute
+        if not rpm or rpm <= 0:
             return
-        min_interval = 60.0 / float(self.requests_per_minute)
-        now = time.time()
-        elapsed = now - self._last_request_ts
-        if elapsed < min_interval:
-            time.sleep(min_interval - elapsed)
-        # Add jitter to avoid fixed intervals
-        jitter = random.uniform(0, min_interval * max(0.0, min(self.request_jitter_ratio, 1.0)))
-        time.sleep(jitter)
-        self._last_request_ts = time.time()
+        rate_key = (rpm, self.request_jitter_ratio)
+        if rate_key != self._rate_key:
+            # Both are plain attributes; recompute only when either changes.
+            self._rate_key = rate_key
+            self._min_interval = 60.0 / float(rpm)
+            self._jitter_max = self._min_interval * max(0.0, min(self.request_jitter_ratio, 1.0))
+        now = time.monotonic()
+        sleep_for = self._next_ok - now
+        if sleep_for > 0:
+            time.sleep(sleep_for)
+        # Jitter is folded into the next wake time to avoid fixed intervals.
+        jitter = random.uniform(0, self._jitter_max) if self._jitter_max else 0.0
+        self._next_ok = max(now, self._next_ok) + self._min_interval + jitter
 
     def save_raw_response(self, label: str, url: str, params: dict, status: int, data: Any) -> None:
         mode = str(self.save_raw_mode or "errors").lower()
@@ -216,52 +458,56 @@ class IGCrawler:
             return
         if mode in {"errors", "error"} and status == 200:
             return
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        # One clock read for both the filename and the recorded timestamp.
+        now = datetime.now(timezone.utc)
+        timestamp = now.strftime("%Y%m%d_%H%M%S_%f")[:-3]
         filename = f"{timestamp}_{label}.json"
-        path = self.data_dir / "raw_responses" / filename
+        path = self._raw_dir / filename
         payload = {
             "url": url,
-            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "timestamp": now.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
             "status": status,
             "params": params,
             "data": data,
         }
-        path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        with open(path, "wb") as fh:
+            json_compat.dump(payload, fh, indent=True)
         self.cleanup_raw_responses()
 
     def cleanup_raw_responses(self) -> None:
-        raw_dir = self.data_dir / "raw_responses"
-        if not raw_dir.exists():
+        # One directory pass, one stat per file: (mtime, size, path).
+        files = []
+        try:
+            with os.scandir(self._raw_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith("_response.json"):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
             return
-        files = sorted(raw_dir.glob("*_response.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+        files.sort(reverse=True)
+
         if self.raw_keep is not None and self.raw_keep >= 0:
-            for path in files[self.raw_keep:]:
+            for _, _, path in files[self.raw_keep:]:
                 try:
-                    path.unlink()
-                except Exception:
+                    os.unlink(path)
+                except OSError:
                     pass
+            del files[self.raw_keep:]
         if self.raw_max_mb is not None and self.raw_max_mb > 0:
             max_bytes = self.raw_max_mb * 1024 * 1024
-            files = sorted(raw_dir.glob("*_response.json"), key=lambda p: p.stat().st_mtime, reverse=True)
-            total = 0
-            for path in files:
+            total = sum(size for _, size, _ in files)
+            while total > max_bytes and files:
+                _, size, path = files.pop()
                 try:
-                    total += path.stat().st_size
-                except Exception:
-                    continue
-            if total > max_bytes:
-                for path in reversed(files):
-                    try:
-                        size = path.stat().st_size
-                    except Exception:
-                        size = 0
-                    try:
-                        path.unlink()
-                    except Exception:
-                        pass
-                    total -= size
-                    if total <= max_bytes:
-                        break
+                    os.unlink(path)
+                except OSError:
+                    pass
+                total -= size
 
     def request_with_retry(self, method: str, url: str, params: dict, data: dict) -> Optional[dict]:
         for attempt in range(1, self.retry_attempts + 1):
@@ -275,7 +521,7 @@ class IGCrawler:
                 continue
 
             try:
-                payload = response.json()
+                payload = json_compat.loads(response.content)
             except Exception:
                 payload = {"error": response.text}
 
@@ -294,6 +540,14 @@ class IGCrawler:
 
         return None
 
+    def render_variables(self, name: str, endpoint: dict, variables: Dict[str, Any]) -> Any:
+        cached = self._variable_renderers.get(name)
+        # Recompile if the endpoint config was swapped after construction.
+        if cached is None or cached[0] is not endpoint:
+            cached = (endpoint, compile_template(endpoint.get("variables", {})))
+            self._variable_renderers[name] = cached
+        return cached[1](variables)
+
     def build_request(self, endpoint: dict, variables: dict) -> Tuple[str, str, dict, dict]:
         url = endpoint.get("url")
         if not url:
@@ -304,18 +558,21 @@ class IGCrawler:
         data = {}
 
         endpoint_type = endpoint.get("type", "graphql")
+        extra_params = endpoint.get("params")
         if endpoint_type == "graphql":
-            if endpoint.get("doc_id"):
-                data["doc_id"] = endpoint.get("doc_id")
-            if endpoint.get("query_hash"):
-                data["query_hash"] = endpoint.get("query_hash")
-            if endpoint.get("params"):
-                data.update(endpoint.get("params"))
+            doc_id = endpoint.get("doc_id")
+            if doc_id:
+                data["doc_id"] = doc_id
+            query_hash = endpoint.get("query_hash")
+            if query_hash:
+                data["query_hash"] = query_hash
+            if extra_params:
+                data.update(extra_params)
             if variables:
-                data["variables"] = json.dumps(variables, separators=(",", ":"), ensure_ascii=False)
+                data["variables"] = json_compat.dumps(variables).decode("utf-8")
         else:
-            if endpoint.get("params"):
-                params.update(endpoint.get("params"))
+            if extra_params:
+                params.update(extra_params)
             if variables:
                 data.update(variables)
 
@@ -326,9 +583,9 @@ class IGCrawler:
         return method, url, params, data
 
     def resolve_media_id(self, shortcode: str) -> Tuple[Optional[str], dict]:
-        endpoint = self.config.get("endpoints", {}).get("post_by_shortcode")
+        endpoint = self.endpoints["post_by_shortcode"]
         base_media_id = shortcode_to_media_id(shortcode)
-        if not endpoint or str(endpoint.get("doc_id", "")).startswith("YOUR_"):
+        if not endpoint:
             print("post_by_shortcode endpoint not configured. Falling back to shortcode decode/HTML.")
             media_id = base_media_id or self.resolve_media_id_from_html(shortcode)
             return media_id, {"media_id": media_id}
@@ -347,29 +604,14 @@ class IGCrawler:
             print("post_by_shortcode request failed. Falling back to shortcode decode/HTML.")
             return None, {}
 
-        media_id = pick_first_path(payload, [
-            ["data", "xdt_shortcode_media", "id"],
-            ["data", "shortcode_media", "id"],
-            ["data", "xdt_shortcode_media", "pk"],
-            ["data", "shortcode_media", "pk"],
-            ["data", "media", "id"],
-            ["data", "media", "pk"],
-        ])
+        data = payload.get("data")
+        media_id = pick_first_path(data, MEDIA_ID_PATHS)
 
         post_info = {
             "media_id": media_id,
-            "owner_id": pick_first_path(payload, [
-                ["data", "xdt_shortcode_media", "owner", "id"],
-                ["data", "shortcode_media", "owner", "id"],
-            ]),
-            "caption": pick_first_path(payload, [
-                ["data", "xdt_shortcode_media", "edge_media_to_caption", "edges", 0, "node", "text"],
-                ["data", "shortcode_media", "edge_media_to_caption", "edges", 0, "node", "text"],
-            ]),
-            "created_at": parse_timestamp(pick_first_path(payload, [
-                ["data", "xdt_shortcode_media", "taken_at_timestamp"],
-                ["data", "shortcode_media", "taken_at_timestamp"],
-            ])),
+            "owner_id": pick_first_path(data, OWNER_ID_PATHS),
+            "caption": pick_first_path(data, CAPTION_PATHS),
+            "created_at": parse_timestamp(pick_first_path(data, TAKEN_AT_PATHS)),
         }
 
         resolved_media_id = str(media_id) if media_id else None
@@ -385,61 +627,45 @@ class IGCrawler:
             return None
         if response.status_code != 200:
             return None
-        text = response.text
-        patterns = [
-            r'"media_id":"(\\d+)"',
-            rf'"id":"(\\d+)","shortcode":"{re.escape(shortcode)}"',
-            rf'"pk":"(\\d+)","shortcode":"{re.escape(shortcode)}"',
-        ]
-        for pattern in patterns:
-            match = re.search(pattern, text)
-            if match:
-                return match.group(1)
-        return None
+        # Scan the raw bytes; no need to decode the whole page.
+        match = html_media_id_pattern(shortcode).search(response.content)
+        if not match:
+            return None
+        return (match.group(1) or match.group(2)).decode("ascii")
 
     def extract_comment_connection(self, payload: dict) -> Tuple[List[dict], dict, Optional[int]]:
-        candidates = [
-            ["data", "xdt_api__v1__media__media_id__comments__connection"],
-            ["data", "xdt_shortcode_media", "edge_media_to_parent_comment"],
-            ["data", "shortcode_media", "edge_media_to_parent_comment"],
-            ["data", "xdt_shortcode_media", "edge_media_to_comment"],
-            ["data", "shortcode_media", "edge_media_to_comment"],
-        ]
-        for path in candidates:
-            connection = deep_get(payload, path)
+        data = payload.get("data")
+        if not isinstance(data, dict):
+            return [], {}, None
+        for path in COMMENT_CONNECTION_PATHS:
+            connection = deep_get(data, path)
             if connection and isinstance(connection, dict):
-                edges = connection.get("edges", [])
-                page_info = connection.get("page_info", {})
-                count = connection.get("count")
-                return edges, page_info, count
+                return connection_parts(connection)
         connection = find_connection_in_data(payload, ["__comments__connection"])
         if connection and isinstance(connection, dict):
-            return connection.get("edges", []), connection.get("page_info", {}), connection.get("count")
+            return connection_parts(connection)
         return [], {}, None
 
     def extract_reply_connection(self, payload: dict) -> Tuple[List[dict], dict, Optional[int]]:
-        candidates = [
-            ["data", "comment", "edge_threaded_comments"],
-            ["data", "comment", "edge_media_to_parent_comment"],
-            ["data", "comment", "edge_media_to_comment"],
-        ]
-        for path in candidates:
-            connection = deep_get(payload, path)
+        data = payload.get("data")
+        if not isinstance(data, dict):
+            return [], {}, None
+        for path in REPLY_CONNECTION_PATHS:
+            connection = deep_get(data, path)
             if connection and isinstance(connection, dict):
-                edges = connection.get("edges", [])
-                page_info = connection.get("page_info", {})
-                count = connection.get("count")
-                return edges, page_info, count
+                return connection_parts(connection)
         connection = find_connection_in_data(payload, ["__replies__connection", "__comments__replies__connection"])
         if connection and isinstance(connection, dict):
-            return connection.get("edges", []), connection.get("page_info", {}), connection.get("count")
+            return connection_parts(connection)
         connection = find_connection_in_data(payload, ["__child_comments__connection"])
         if connection and isinstance(connection, dict):
-            return connection.get("edges", []), connection.get("page_info", {}), connection.get("count")
+            return connection_parts(connection)
         return self.extract_comment_connection(payload)
 
     def parse_user(self, node: dict) -> dict:
-        user = node.get("owner") or node.get("user") or {}
+        user = node.get("owner") or node.get("user")
+        if not user:
+            return {"id": None, "username": None, "full_name": None, "is_verified": None}
         return {
             "id": user.get("id") or user.get("pk"),
             "username": user.get("username"),
@@ -447,8 +673,9 @@ class IGCrawler:
             "is_verified": user.get("is_verified"),
         }
 
-    def parse_comment_node(self, node: dict, post_owner_id: Optional[str]) -> dict:
-        comment_id = node.get("id") or node.get("pk")
+    def parse_comment_node(self, node: dict, post_owner_id: Optional[str], comment_id: Optional[str] = None) -> dict:
+        if comment_id is None:
+            comment_id = comment_node_id(node)
         created_at = parse_timestamp(node.get("created_at") or node.get("created_at_utc") or node.get("created_at_time"))
         like_count = node.get("like_count")
         if like_count is None:
@@ -459,6 +686,9 @@ class IGCrawler:
         user = self.parse_user(node)
         is_author = post_owner_id and user.get("id") and str(user.get("id")) == str(post_owner_id)
 
+        # Most comments carry no GIF; skip the lookup chain unless one is attached.
+        gif_info = node.get("giphy_media_info")
+
         reply_count = None
         if isinstance(node.get("edge_threaded_comments"), dict):
             reply_count = node.get("edge_threaded_comments", {}).get("count")
@@ -466,11 +696,11 @@ class IGCrawler:
             reply_count = node.get("child_comment_count")
 
         return {
-            "id": str(comment_id) if comment_id is not None else None,
+            "id": comment_id,
             "text": node.get("text") or node.get("comment_text"),
             "created_at": created_at,
             "like_count": like_count,
-            "gif_url": extract_gif_url(node),
+            "gif_url": gif_url_from_info(gif_info) if gif_info else None,
             "user": user,
             "is_author": bool(is_author),
             "reply_count": reply_count or 0,
@@ -486,13 +716,12 @@ class IGCrawler:
         return edges, page_info
 
     def fetch_comments_page(self, shortcode: str, media_id: Optional[str], cursor: Optional[str]) -> Optional[dict]:
-        endpoint = self.config.get("endpoints", {}).get("comments")
-        if not endpoint or str(endpoint.get("doc_id", "")).startswith("YOUR_"):
+        endpoint = self.endpoints["comments"]
+        if not endpoint:
             print("Comments endpoint not configured.")
             return None
 
-        variables_template = endpoint.get("variables", {})
-        variables = render_template(variables_template, {
+        variables = self.render_variables("comments", endpoint, {
             "shortcode": shortcode,
             "media_id": media_id,
             "cursor": cursor,
@@ -505,12 +734,11 @@ class IGCrawler:
         return self.request_with_retry(method, url, params, data)
 
     def fetch_comment_replies(self, comment_id: str, cursor: Optional[str], media_id: Optional[str]) -> Optional[dict]:
-        endpoint = self.config.get("endpoints", {}).get("comment_replies")
-        if not endpoint or str(endpoint.get("doc_id", "")).startswith("YOUR_"):
+        endpoint = self.endpoints["comment_replies"]
+        if not endpoint:
             return None
 
-        variables_template = endpoint.get("variables", {})
-        variables = render_template(variables_template, {
+        variables = self.render_variables("comment_replies", endpoint, {
             "shortcode": None,
             "media_id": media_id,
             "cursor": cursor,
@@ -522,6 +750,48 @@ class IGCrawler:
         method, url, params, data = self.build_request(endpoint, variables)
         return self.request_with_retry(method, url, params, data)
 
+    def _append_replies(self, parent: dict, reply_edges: list, owner_id: Optional[str], seen_comment_ids: set) -> None:
+        parent_id = parent["id"]
+        replies = parent["replies"]
+        for reply_edge in reply_edges:
+            reply_node = reply_edge.get("node") if isinstance(reply_edge, dict) else None
+            if not reply_node:
+                continue
+            reply_id = comment_node_id(reply_node)
+            if not reply_id or reply_id in seen_comment_ids:
+                continue
+            reply = self.parse_comment_node(reply_node, owner_id, reply_id)
+            reply["parent_id"] = parent_id
+            seen_comment_ids.add(reply_id)
+            replies.append(reply)
+
+    def _drain_replies(
+        self,
+        parent: dict,
+        reply_page: dict,
+        media_id: Optional[str],
+        owner_id: Optional[str],
+        seen_comment_ids: set,
+    ) -> None:
+        # Page through one thread's replies. Threads are drained one at a time:
+        # every request already waits on the shared rate limit, so fetching
+        # threads concurrently would not finish any sooner.
+        parent_id = parent["id"]
+        reply_cursor = reply_page.get("end_cursor") if reply_page.get("has_next_page") else None
+        last_reply_cursor = None
+        while True:
+            reply_payload = self.fetch_comment_replies(parent_id, reply_cursor, media_id)
+            if not reply_payload:
+                break
+            reply_edges, next_page, _ = self.extract_reply_connection(reply_payload)
+            self._append_replies(parent, reply_edges, owner_id, seen_comment_ids)
+            if not next_page.get("has_next_page"):
+                break
+            reply_cursor = next_page.get("end_cursor")
+            if not reply_cursor or reply_cursor == last_reply_cursor:
+                break
+            last_reply_cursor = reply_cursor
+
     def crawl_post_comments(self, post_url: str, max_comments: Optional[int] = None, resume: Optional[bool] = None) -> dict:
         print(f"Start: {post_url}")
         shortcode = extract_shortcode(post_url)
@@ -562,14 +832,21 @@ class IGCrawler:
         interrupted = False
         stop_reason = None
 
-        if resume_state:
+        if not resume_state:
+            # Start the resume sidecar over instead of appending to a stale one.
+            self._resume_written[shortcode] = (0, 0)
+            self._resume_saved_key.pop(shortcode, None)
+        else:
             all_comments = resume_state.get("comments", [])
-            seen_comment_ids = set(resume_state.get("seen_comment_ids", []))
+            seen_comment_ids = resume_state.get("seen_comment_ids") or set()
             cursor = resume_state.get("cursor")
             last_cursor = resume_state.get("last_cursor")
             page = resume_state.get("pages", 0)
             total_count = resume_state.get("expected_comment_count")
 
+        owner_id = post_info.get("owner_id")
+        # fetch_replies can be changed after construction (CLI flags), so check per crawl.
+        replies_enabled = bool(self.fetch_replies and self.endpoints["comment_replies"])
         start_time = time.monotonic()
         try:
             while True:
@@ -609,55 +886,23 @@ class IGCrawler:
                     if not node:
                         continue
 
-                    parsed = self.parse_comment_node(node, post_info.get("owner_id"))
-                    parsed_id = parsed.get("id")
+                    # Skip duplicates before doing any parsing work.
+                    parsed_id = comment_node_id(node)
                     if parsed_id in seen_comment_ids:
                         continue
+                    parsed = self.parse_comment_node(node, owner_id, parsed_id)
                     seen_comment_ids.add(parsed_id)
 
                     reply_count = parsed.get("reply_count") or 0
-                    replies_endpoint = self.config.get("endpoints", {}).get("comment_replies", {})
-                    replies_enabled = self.fetch_replies and bool(replies_endpoint) and not str(replies_endpoint.get("doc_id", "")).startswith("YOUR_")
 
                     # Inline replies if present
                     reply_edges, reply_page = self.extract_replies_from_node(node)
                     if reply_edges:
-                        for reply_edge in reply_edges:
-                            reply_node = reply_edge.get("node") if isinstance(reply_edge, dict) else None
-                            if not reply_node:
-                                continue
-                            reply = self.parse_comment_node(reply_node, post_info.get("owner_id"))
-                            reply["parent_id"] = parsed_id
-                            reply_id = reply.get("id")
-                            if reply_id and reply_id not in seen_comment_ids:
-                                seen_comment_ids.add(reply_id)
-                                parsed["replies"].append(reply)
+                        self._append_replies(parsed, reply_edges, owner_id, seen_comment_ids)
 
                     # Fetch replies if needed
                     if replies_enabled and parsed_id and (reply_count > len(parsed["replies"]) or reply_page.get("has_next_page")):
-                        reply_cursor = reply_page.get("end_cursor") if reply_page.get("has_next_page") else None
-                        last_reply_cursor = None
-                        while True:
-                            reply_payload = self.fetch_comment_replies(parsed_id, reply_cursor, media_id)
-                            if not reply_payload:
-                                break
-                            reply_edges2, reply_page2, _ = self.extract_reply_connection(reply_payload)
-                            for reply_edge in reply_edges2:
-                                reply_node = reply_edge.get("node") if isinstance(reply_edge, dict) else None
-                                if not reply_node:
-                                    continue
-                                reply = self.parse_comment_node(reply_node, post_info.get("owner_id"))
-                                reply["parent_id"] = parsed_id
-                                reply_id = reply.get("id")
-                                if reply_id and reply_id not in seen_comment_ids:
-                                    seen_comment_ids.add(reply_id)
-                                    parsed["replies"].append(reply)
-                            if not reply_page2.get("has_next_page"):
-                                break
-                            reply_cursor = reply_page2.get("end_cursor")
-                            if not reply_cursor or reply_cursor == last_reply_cursor:
-                                break
-                            last_reply_cursor = reply_cursor
+                        self._drain_replies(parsed, reply_page, media_id, owner_id, seen_comment_ids)
 
                     all_comments.append(parsed)
 
@@ -682,30 +927,46 @@ class IGCrawler:
                     break
                 last_cursor = cursor
 
-                self.save_resume_state(
-                    shortcode=shortcode,
-                    post_info=post_info,
-                    comments=all_comments,
-                    seen_ids=seen_comment_ids,
-                    cursor=cursor,
-                    last_cursor=last_cursor,
-                    page=page,
-                    expected_count=total_count,
-                    stop_reason=stop_reason,
-                    complete=False,
-                )
+                if page % self.resume_save_every == 0:
+                    self.save_resume_state(
+                        shortcode=shortcode,
+                        post_info=post_info,
+                        comments=all_comments,
+                        seen_ids=seen_comment_ids,
+                        cursor=cursor,
+                        last_cursor=last_cursor,
+                        page=page,
+                        expected_count=total_count,
+                        stop_reason=stop_reason,
+                        complete=False,
+                    )
         except KeyboardInterrupt:
             interrupted = True
             stop_reason = "interrupted"
             print("Stop: interrupted")
         except StopIteration:
             pass
+        except Exception:
+            # Keep the pages collected since the last periodic save.
+            self.save_resume_state(
+                shortcode=shortcode,
+                post_info=post_info,
+                comments=all_comments,
+                seen_ids=seen_comment_ids,
+                cursor=cursor,
+                last_cursor=last_cursor,
+                page=page,
+                expected_count=total_count,
+                stop_reason="error",
+                complete=False,
+            )
+            raise
 
         result = {
             "post": post_info,
             "comment_count": len(all_comments),
             "expected_comment_count": total_count,
-            "fetched_at": datetime.utcnow().isoformat() + "Z",
+            "fetched_at": utc_now_iso(),
             "comments": all_comments,
             "pages": page,
             "stop_reason": stop_reason,
@@ -717,42 +978,93 @@ class IGCrawler:
         total_elapsed = time.monotonic() - start_time
         print(f"Total time: {total_elapsed:.2f}s")
 
-        complete = (stop_reason == "no_more_pages")
-        if complete:
-            self.clear_resume_state(shortcode)
-        else:
-            self.save_resume_state(
-                shortcode=shortcode,
-                post_info=post_info,
-                comments=all_comments,
-                seen_ids=seen_comment_ids,
-                cursor=cursor,
-                last_cursor=last_cursor,
-                page=page,
-                expected_count=total_count,
-                stop_reason=stop_reason,
-                complete=False,
-            )
+        self.save_resume_state(
+            shortcode=shortcode,
+            post_info=post_info,
+            comments=all_comments,
+            seen_ids=seen_comment_ids,
+            cursor=cursor,
+            last_cursor=last_cursor,
+            page=page,
+            expected_count=total_count,
+            stop_reason=stop_reason,
+            complete=(stop_reason == "no_more_pages"),
+        )
         return result
 
     def save_output(self, shortcode: str, data: dict) -> Path:
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        timestamp = time.strftime("%Y%m%d_%H%M%S", time.gmtime())
+        if self.jsonl_output:
+            # One top-level comment per line; everything else in a .meta.json.
+            path = self._comments_dir / f"{shortcode}_{timestamp}.jsonl"
+            with open(path, "wb", buffering=1 << 20) as fh:
+                for comment in data.get("comments", []):
+                    fh.write(json_compat.dumps(comment) + b"\n")
+            meta = {key: value for key, value in data.items() if key != "comments"}
+            with open(self._comments_dir / f"{shortcode}_{timestamp}.meta.json", "wb") as fh:
+                json_compat.dump(meta, fh, indent=not self.compact_output)
+            return path
         filename = f"{shortcode}_{timestamp}.json"
-        path = self.data_dir / "ig_comments" / filename
-        path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        path = self._comments_dir / filename
+        with open(path, "wb") as fh:
+            json_compat.dump(data, fh, indent=not self.compact_output)
         return path
 
     def resume_path(self, shortcode: str) -> Path:
-        return self.data_dir / "ig_comments" / f"{shortcode}_resume.json"
+        return self._comments_dir / f"{shortcode}_resume.json"
+
+    def resume_comments_path(self, shortcode: str) -> Path:
+        return self._comments_dir / f"{shortcode}_resume.jsonl"
+
+    def _resume_files(self, shortcode: str) -> Tuple[str, str, str]:
+        files = self._resume_file_cache.get(shortcode)
+        if files is None:
+            meta_path = str(self.resume_path(shortcode))
+            files = (meta_path, meta_path + ".tmp", str(self.resume_comments_path(shortcode)))
+            self._resume_file_cache[shortcode] = files
+        return files
 
     def load_resume_state(self, shortcode: str) -> Optional[dict]:
-        path = self.resume_path(shortcode)
-        if not path.exists():
-            return None
+        path, _, comments_path = self._resume_files(shortcode)
         try:
-            return json.loads(path.read_text(encoding="utf-8"))
+            with open(path, "rb") as file:
+                state = json_compat.loads(file.read())
+            comment_count = state.get("comment_count", 0)
+            comments = []
+            offset = 0
+            has_tail = False
+            legacy_comments = state.get("comments")
+            if isinstance(legacy_comments, list) and not os.path.exists(comments_path):
+                # Older format: comments inline in the JSON file, no sidecar.
+                # The next save writes them all to a fresh sidecar.
+                comments = legacy_comments
+                comment_count = 0
+            elif os.path.exists(comments_path):
+                # Stream the sidecar line by line instead of reading it whole.
+                with open(comments_path, "rb") as file:
+                    for _ in range(comment_count):
+                        line = file.readline()
+                        if not line.endswith(b"\n"):
+                            return None
+                        comments.append(json_compat.loads(line))
+                    offset = file.tell()
+                    has_tail = bool(file.read(1))
+            elif comment_count:
+                return None
         except Exception:
             return None
+        if has_tail:
+            # Comments (or a torn line) appended after the last metadata write;
+            # cut them off so the sidecar matches the saved metadata.
+            os.truncate(comments_path, offset)
+        self._resume_written[shortcode] = (comment_count, offset)
+        self._resume_saved_key.pop(shortcode, None)
+        seen_ids = seen_ids_from_comments(comments)
+        if comments is legacy_comments:
+            seen_ids.update(state.get("seen_comment_ids") or ())
+        state["comments"] = comments
+        state["seen_comment_ids"] = seen_ids
+        return state
 
     def save_resume_state(
         self,
@@ -767,23 +1079,62 @@ class IGCrawler:
         stop_reason: Optional[str],
         complete: bool,
     ) -> None:
+        if complete:
+            # A finished crawl has nothing to resume; drop the files instead.
+            self.clear_resume_state(shortcode)
+            return
+
+        # Nothing new since the last save (e.g. an all-duplicate page): skip it.
+        key = (cursor, last_cursor, len(comments), page, expected_count, stop_reason)
+        if self._resume_saved_key.get(shortcode) == key:
+            return
+
+        # Comments go to an append-only JSONL sidecar; only those added since the
+        # last save are written. The JSON file keeps the small crawl metadata.
+        path, tmp_path, comments_path = self._resume_files(shortcode)
+        written, committed = self._resume_written.get(shortcode, (0, 0))
+        if written > len(comments):
+            written = committed = 0
+        with open(comments_path, "ab" if written else "wb", buffering=1 << 20) as file:
+            if written:
+                # Drop lines left by an interrupted earlier save, so they are
+                # not duplicated; rewrite everything if the file got shorter.
+                size = file.seek(0, os.SEEK_END)
+                if size != committed:
+                    if size < committed:
+                        written = committed = 0
+                    file.truncate(committed)
+                    file.seek(0, os.SEEK_END)
+            for comment in comments[written:]:
+                file.write(json_compat.dumps(comment) + b"\n")
+            file.flush()
+            committed = file.tell()
+        self._resume_written[shortcode] = (len(comments), committed)
+
         state = {
             "post": post_info,
             "comment_count": len(comments),
-            "comments": comments,
-            "seen_comment_ids": list(seen_ids),
+            # The ids themselves are rebuilt from the sidecar on load.
+            "seen_ids_count": len(seen_ids),
             "cursor": cursor,
             "last_cursor": last_cursor,
             "pages": page,
             "expected_comment_count": expected_count,
             "stop_reason": stop_reason,
             "complete": complete,
-            "updated_at": datetime.utcnow().isoformat() + "Z",
+            "updated_at": utc_now_iso(),
         }
-        path = self.resume_path(shortcode)
-        path.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+        # Machine-read only; compact keeps the per-page rewrite small. Write a
+        # temp file and rename so an interrupted save leaves the old state intact.
+        with open(tmp_path, "wb") as file:
+            file.write(json_compat.dumps(state))
+        os.replace(tmp_path, path)
+        self._resume_saved_key[shortcode] = key
 
     def clear_resume_state(self, shortcode: str) -> None:
-        path = self.resume_path(shortcode)
-        if path.exists():
-            path.unlink()
+        self._resume_written.pop(shortcode, None)
+        self._resume_saved_key.pop(shortcode, None)
+        path, _, comments_path = self._resume_files(shortcode)
+        for file_path in (path, comments_path):
+            if os.path.exists(file_path):
+                os.unlink(file_path)
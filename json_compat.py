@@ -0,0 +1,47 @@
+"""
+JSON encode/decode helpers.
+Uses orjson when it is installed, stdlib json otherwise.
+"""
+
+import io
+import json
+from typing import Any, BinaryIO, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option)
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dump(obj: Any, fh: BinaryIO, indent: bool = False) -> None:
+    # Write to a binary file. The stdlib path streams chunks through a text
+    # wrapper instead of building the whole document as one str first.
+    if orjson is not None:
+        fh.write(dumps(obj, indent=indent))
+        return
+    text = io.TextIOWrapper(fh, encoding="utf-8")
+    try:
+        if indent:
+            json.dump(obj, text, ensure_ascii=False, indent=2)
+        else:
+            json.dump(obj, text, ensure_ascii=False, separators=(",", ":"))
+        text.flush()
+    finally:
+        text.detach()
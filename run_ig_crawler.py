@@ -5,38 +5,49 @@ CLI entry for Instagram crawler.
 
 import argparse
 
-from ig_crawler import IGCrawler
+# Imported on first use so --help and argument errors skip loading requests;
+# tests replace this with a stand-in.
+IGCrawler = None
 
 
-def main() -> int:
+def _build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser()
     parser.add_argument("--post-url", required=True, help="Instagram post URL")
     parser.add_argument("--config", default="config.json", help="Config file path")
     parser.add_argument("--max-comments", type=int, default=None, help="Stop after N unique comments")
+    # Each pair shares one dest: True/False when given, None to keep the config default.
     resume_group = parser.add_mutually_exclusive_group()
-    resume_group.add_argument("--resume", action="store_true", help="Resume from previous state")
-    resume_group.add_argument("--no-resume", action="store_true", help="Disable resume")
+    resume_group.add_argument("--resume", dest="resume", action="store_const", const=True, help="Resume from previous state")
+    resume_group.add_argument("--no-resume", dest="resume", action="store_const", const=False, help="Disable resume")
     replies_group = parser.add_mutually_exclusive_group()
-    replies_group.add_argument("--fetch-replies", action="store_true", help="Force enable replies")
-    replies_group.add_argument("--no-replies", action="store_true", help="Disable replies")
-    args = parser.parse_args()
+    replies_group.add_argument("--fetch-replies", dest="replies", action="store_const", const=True, help="Force enable replies")
+    replies_group.add_argument("--no-replies", dest="replies", action="store_const", const=False, help="Disable replies")
+    parser.add_argument("--compact", action="store_true", help="Write output JSON without indentation")
+    parser.add_argument("--jsonl", action="store_true", help="Write comments as JSONL plus a .meta.json file")
+    return parser
+
+
+_PARSER = _build_parser()
 
-    crawler = IGCrawler(config_file=args.config)
-    resume = None
-    if args.resume:
-        resume = True
-    if args.no_resume:
-        resume = False
 
-    if args.fetch_replies:
-        crawler.fetch_replies = True
-    if args.no_replies:
-        crawler.fetch_replies = False
+def main() -> int:
+    global IGCrawler
+    args = _PARSER.parse_args()
+
+    if IGCrawler is None:
+        from ig_crawler import IGCrawler
+    crawler = IGCrawler(config_file=args.config)
+    if args.replies is not None:
+        crawler.fetch_replies = args.replies
+    if args.compact:
+        crawler.compact_output = True
+    if args.jsonl:
+        crawler.jsonl_output = True
 
     result = crawler.crawl_post_comments(
         args.post_url,
         max_comments=args.max_comments,
-        resume=resume,
+        resume=args.resume,
     )
 
     print(f"Saved: {result.get('output_path')}")
@@ -0,0 +1,130 @@
+import json
+import random
+from urllib.parse import parse_qs
+
+import pytest
+
+from ig_auth_setup import classify_endpoint, parse_query_string, update_env_file
+
+
+def test_update_env_file_rewrites_existing_keys_and_appends_new(tmp_path):
+    env_path = tmp_path / ".env"
+    env_path.write_text("# Instagram cookies\nIG_SESSIONID=old\nIG_TIMEOUT=30\n", encoding="utf-8")
+
+    update_env_file(env_path, {"IG_SESSIONID": "new", "IG_RUR": "rur"})
+
+    assert env_path.read_text(encoding="utf-8") == (
+        "# Instagram cookies\nIG_SESSIONID=new\nIG_TIMEOUT=30\nIG_RUR=rur\n"
+    )
+
+
+def test_update_env_file_creates_missing_file(tmp_path):
+    env_path = tmp_path / ".env"
+
+    update_env_file(env_path, {"IG_SESSIONID": "abc", "IG_CSRFTOKEN": ""})
+
+    assert env_path.read_text(encoding="utf-8") == "IG_SESSIONID=abc\nIG_CSRFTOKEN=\n"
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "",
+        "a=1&b=2",
+        "doc_id=123&variables=abc",
+        "a=1&a=2",
+        "a=&b=2",
+        "a",
+        "=v",
+        "=v&a=1",
+        "a==",
+        "a=1=2",
+        "&&a=1&",
+        "a=1;b=2",
+        "variables=%7B%22first%22%3A20%7D&doc_id=9",
+        "q=hello+world&q=again",
+        "a%20b=c+d&empty=",
+    ],
+)
+def test_parse_query_string_matches_parse_qs(query):
+    expected = {key: values[0] for key, values in parse_qs(query).items()}
+    assert parse_query_string(query) == expected
+
+
+def _reference_classify(payload, url):
+    # The original substring-based rules that classify_endpoint must keep.
+    variables = payload.get("variables")
+    if isinstance(variables, str):
+        try:
+            variables = json.loads(variables)
+        except Exception:
+            variables = None
+    friendly_name = payload.get("fb_api_req_friendly_name") or payload.get("friendly_name")
+    friendly_lower = friendly_name.lower() if isinstance(friendly_name, str) else ""
+    if friendly_lower:
+        if "comment" in friendly_lower:
+            if "reply" in friendly_lower or "repl" in friendly_lower or "child" in friendly_lower:
+                return "comment_replies"
+            return "comments"
+        if "shortcode" in friendly_lower or "media" in friendly_lower:
+            return "post_by_shortcode"
+        if "timeline" in friendly_lower or "feed" in friendly_lower or "stories" in friendly_lower:
+            return None
+    if isinstance(variables, dict):
+        if "comment_id" in variables or "parent_comment_id" in variables:
+            return "comment_replies"
+        if "shortcode" in variables or "short_code" in variables:
+            return "post_by_shortcode"
+        if "media_id" in variables and "first" in variables:
+            return "comments"
+        if "first" in variables and ("after" in variables or "cursor" in variables):
+            return "comments"
+    if "comment" in url:
+        return "comments"
+    return None
+
+
+@pytest.mark.parametrize(
+    "payload, url, expected",
+    [
+        ({"fb_api_req_friendly_name": "PolarisPostCommentsQuery"}, "", "comments"),
+        ({"fb_api_req_friendly_name": "CommentRepliesQuery"}, "", "comment_replies"),
+        ({"fb_api_req_friendly_name": "ChildCommentsPaginationQuery"}, "", "comment_replies"),
+        ({"fb_api_req_friendly_name": "PostByShortcodeQuery"}, "", "post_by_shortcode"),
+        ({"fb_api_req_friendly_name": "MediaInfoQuery"}, "", "post_by_shortcode"),
+        ({"fb_api_req_friendly_name": "storieshortcode"}, "", "post_by_shortcode"),
+        ({"fb_api_req_friendly_name": "FeedTimelineQuery"}, "/comments/", None),
+        ({"friendly_name": "StoriesTray", "variables": '{"first": 1}'}, "", None),
+        ({"fb_api_req_friendly_name": "Other", "variables": '{"comment_id": "1"}'}, "", "comment_replies"),
+        ({"variables": '{"parent_comment_id": "1"}'}, "", "comment_replies"),
+        ({"variables": '{"shortcode": "ABC"}'}, "", "post_by_shortcode"),
+        ({"variables": '{"media_id": "1", "first": 20}'}, "", "comments"),
+        ({"variables": '{"first": 20, "after": "x"}'}, "", "comments"),
+        ({"variables": "not-json"}, "https://www.instagram.com/api/comments/", "comments"),
+        ({"variables": '["first"]'}, "", None),
+        ({}, "https://www.instagram.com/graphql/query", None),
+    ],
+)
+def test_classify_endpoint_cases(payload, url, expected):
+    assert classify_endpoint(payload, url) == expected
+    assert _reference_classify(payload, url) == expected
+
+
+def test_classify_endpoint_matches_reference_rules_on_random_inputs():
+    rng = random.Random(1234)
+    # Overlapping fragments share letters between tokens (e.g. "storieshortcode").
+    fragments = ["Comment", "comments", "Repl", "reply", "Child", "Shortcode", "Media", "Timeline",
+                 "Feed", "Stories", "Polaris", "Query", "Pagination", "x", "",
+                 "storieshortcode", "commentimeline", "feedia", "commenchild", "storiesho", "rtcode"]
+    variable_keys = ["comment_id", "parent_comment_id", "shortcode", "short_code", "media_id",
+                     "first", "after", "cursor", "id"]
+    for _ in range(2000):
+        payload = {}
+        if rng.random() < 0.8:
+            name = "".join(rng.choice(fragments) for _ in range(rng.randint(0, 4)))
+            payload[rng.choice(["fb_api_req_friendly_name", "friendly_name"])] = name
+        if rng.random() < 0.8:
+            keys = rng.sample(variable_keys, rng.randint(0, 4))
+            payload["variables"] = json.dumps({key: 1 for key in keys})
+        url = rng.choice(["https://www.instagram.com/graphql/query", "https://www.instagram.com/api/v1/comments/"])
+        assert classify_endpoint(payload, url) == _reference_classify(payload, url), payload
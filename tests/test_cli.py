@@ -10,12 +10,16 @@ def test_cli_main_with_resume_and_fetch_replies(monkeypatch, capsys):
         def __init__(self, config_file):
             calls["config_file"] = config_file
             self.fetch_replies = False
+            self.compact_output = False
+            self.jsonl_output = False
 
         def crawl_post_comments(self, post_url, max_comments=None, resume=None):
             calls["post_url"] = post_url
             calls["max_comments"] = max_comments
             calls["resume"] = resume
             calls["fetch_replies"] = self.fetch_replies
+            calls["compact_output"] = self.compact_output
+            calls["jsonl_output"] = self.jsonl_output
             return {"output_path": "out.json", "comment_count": 3}
 
     monkeypatch.setattr(run_ig_crawler, "IGCrawler", DummyCrawler)
@@ -32,6 +36,8 @@ def test_cli_main_with_resume_and_fetch_replies(monkeypatch, capsys):
             "12",
             "--resume",
             "--fetch-replies",
+            "--compact",
+            "--jsonl",
         ],
     )
 
@@ -44,6 +50,8 @@ def test_cli_main_with_resume_and_fetch_replies(monkeypatch, capsys):
     assert calls["max_comments"] == 12
     assert calls["resume"] is True
     assert calls["fetch_replies"] is True
+    assert calls["compact_output"] is True
+    assert calls["jsonl_output"] is True
     assert "Saved: out.json" in captured
     assert "Comments: 3" in captured
 
@@ -0,0 +1,25 @@
+import json
+
+from config_loader import ConfigLoader
+
+
+def test_config_loader_instances_do_not_share_parsed_config(tmp_path):
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps({"instagram": {"settings": {"comments_first": 7}}}), encoding="utf-8")
+
+    first = ConfigLoader(config_file=str(config_path))
+    first.config["instagram"]["settings"]["comments_first"] = 99
+    second = ConfigLoader(config_file=str(config_path))
+
+    assert second.get("instagram.settings.comments_first") == 7
+
+
+def test_config_loader_save_to_json_is_picked_up_by_next_loader(tmp_path):
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps({"instagram": {"settings": {"comments_first": 7}}}), encoding="utf-8")
+
+    loader = ConfigLoader(config_file=str(config_path))
+    loader.config["instagram"]["settings"]["comments_first"] = 12
+    loader.save_to_json()
+
+    assert ConfigLoader(config_file=str(config_path)).get("instagram.settings.comments_first") == 12
@@ -1,4 +1,11 @@
-from ig_crawler import extract_shortcode, parse_timestamp, render_template, shortcode_to_media_id
+from ig_crawler import (
+    compile_template,
+    extract_shortcode,
+    html_media_id_pattern,
+    parse_timestamp,
+    render_template,
+    shortcode_to_media_id,
+)
 
 
 def test_extract_shortcode_supports_post_reel_tv():
@@ -55,5 +62,47 @@ def test_render_template_none_replacement_returns_none():
     assert render_template("{cursor}", {"cursor": None}) is None
 
 
+def test_compile_template_matches_render_template():
+    template = {
+        "first": 20,
+        "shortcode": "{shortcode}",
+        "cursor": "{cursor}",
+        "skip": None,
+        "items": ["ok", "{media_id}", "{unknown}"],
+        "static": {"keep": "x", "drop": None},
+    }
+    render = compile_template(template)
+    for variables in ({"shortcode": "abc", "cursor": "c1", "media_id": 42}, {"shortcode": "abc", "cursor": None}):
+        assert render(variables) == render_template(template, variables)
+
+    first = render({"shortcode": "abc"})
+    first["first"] = 50
+    assert render({"shortcode": "abc"})["first"] == 20
+
+
 def test_parse_timestamp_from_unix_seconds():
     assert parse_timestamp(1700000000) == "2023-11-14T22:13:20Z"
+
+
+def test_parse_timestamp_keeps_fractional_seconds():
+    assert parse_timestamp(1700000000.0) == "2023-11-14T22:13:20Z"
+    assert parse_timestamp(1700000000.25) == "2023-11-14T22:13:20.250000Z"
+
+
+def test_html_media_id_pattern_matches_media_id_field():
+    html = b'<script>{"foo":1,"media_id":"3822619000111","bar":2}</script>'
+    match = html_media_id_pattern("ABC123").search(html)
+    assert match is not None
+    assert (match.group(1) or match.group(2)) == b"3822619000111"
+
+
+def test_html_media_id_pattern_matches_pk_before_own_shortcode():
+    html = b'{"pk":"777","shortcode":"ABC123","taken_at":1}'
+    match = html_media_id_pattern("ABC123").search(html)
+    assert match is not None
+    assert (match.group(1) or match.group(2)) == b"777"
+
+
+def test_html_media_id_pattern_ignores_other_shortcodes():
+    html = b'{"id":"555","shortcode":"OTHER99"},{"pk":"666","shortcode":"ABC1234"}'
+    assert html_media_id_pattern("ABC123").search(html) is None
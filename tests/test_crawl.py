@@ -0,0 +1,83 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from ig_crawler import IGCrawler
+
+CONFIG_PATH = Path(__file__).resolve().parents[1] / "config.example.json"
+PAGE_COUNT = 8
+PER_PAGE = 3
+
+
+def make_page(index):
+    edges = [{"node": {"id": f"{index}-{i}", "text": "hi"}} for i in range(PER_PAGE)]
+    return {
+        "data": {
+            "xdt_shortcode_media": {
+                "edge_media_to_parent_comment": {
+                    "edges": edges,
+                    "page_info": {"has_next_page": index < PAGE_COUNT - 1, "end_cursor": f"c{index + 1}"},
+                    "count": PAGE_COUNT * PER_PAGE,
+                }
+            }
+        }
+    }
+
+
+class StubCrawler(IGCrawler):
+    __slots__ = ("fail_at", "fetched", "saved_pages")
+
+    def resolve_media_id(self, shortcode):
+        return "123", {"owner_id": "42"}
+
+    def fetch_comments_page(self, shortcode, media_id, cursor):
+        index = 0 if cursor is None else int(cursor[1:])
+        self.fetched.append(cursor)
+        if index == self.fail_at:
+            raise RuntimeError("boom")
+        return make_page(index)
+
+    def save_resume_state(self, **state):
+        self.saved_pages.append(state["page"])
+        super().save_resume_state(**state)
+
+
+def make_crawler(data_dir, fail_at=None):
+    crawler = StubCrawler(data_dir=str(data_dir), config_file=str(CONFIG_PATH))
+    crawler.fail_at = fail_at
+    crawler.fetched = []
+    crawler.saved_pages = []
+    crawler.fetch_replies = False
+    crawler.max_comments = None
+    crawler.resume_save_every = 3
+    return crawler
+
+
+def test_crawl_saves_resume_state_on_error_and_resumes_without_gaps(tmp_path):
+    url = "https://www.instagram.com/p/CRAWL/"
+    crawler = make_crawler(tmp_path, fail_at=5)
+
+    with pytest.raises(RuntimeError):
+        crawler.crawl_post_comments(url, resume=True)
+
+    # Periodic save after page 3, then the error save after page 5.
+    assert crawler.saved_pages == [3, 5]
+    meta = json.loads(crawler.resume_path("CRAWL").read_bytes())
+    assert meta["stop_reason"] == "error"
+    assert meta["pages"] == 5
+    assert meta["cursor"] == "c5"
+    assert meta["comment_count"] == 5 * PER_PAGE
+
+    resumed = make_crawler(tmp_path)
+    result = resumed.crawl_post_comments(url, resume=True)
+
+    assert resumed.fetched[0] == "c5"
+    ids = [comment["id"] for comment in result["comments"]]
+    assert len(ids) == len(set(ids))
+    assert set(ids) == {f"{page}-{i}" for page in range(PAGE_COUNT) for i in range(PER_PAGE)}
+    assert result["stop_reason"] == "no_more_pages"
+    # Page 6 hits the save interval; page 8 is the final (complete) save.
+    assert resumed.saved_pages == [6, 8]
+    assert not resumed.resume_path("CRAWL").exists()
+    assert not resumed.resume_comments_path("CRAWL").exists()
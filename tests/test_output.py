@@ -0,0 +1,20 @@
+import json
+
+
+def test_save_output_jsonl_writes_comments_and_meta(crawler):
+    crawler.jsonl_output = True
+    data = {
+        "post": {"shortcode": "OUT"},
+        "comment_count": 2,
+        "comments": [{"id": "1", "replies": [{"id": "3"}]}, {"id": "2", "replies": []}],
+        "pages": 1,
+    }
+
+    path = crawler.save_output("OUT", data)
+
+    assert path.suffix == ".jsonl"
+    lines = path.read_bytes().splitlines()
+    assert [json.loads(line) for line in lines] == data["comments"]
+    meta_path = path.with_name(path.name[: -len(".jsonl")] + ".meta.json")
+    meta = json.loads(meta_path.read_bytes())
+    assert meta == {"post": {"shortcode": "OUT"}, "comment_count": 2, "pages": 1}
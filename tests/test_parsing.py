@@ -134,3 +134,26 @@ def test_extract_reply_connection_falls_back_to_comment_connection(crawler):
     assert len(edges) == 1
     assert page_info["has_next_page"] is False
     assert count == 3
+
+
+def test_parse_user_without_owner_returns_independent_dicts(crawler):
+    first = crawler.parse_user({})
+    second = crawler.parse_user({"user": None})
+    first["username"] = "changed"
+
+    assert second == {"id": None, "username": None, "full_name": None, "is_verified": None}
+    assert crawler.parse_user({})["username"] is None
+
+
+def test_resolve_media_id_from_html_scans_page_bytes(crawler):
+    class FakeResponse:
+        status_code = 200
+        content = b'<html>{"id":"111","shortcode":"OTHER"} {"id":"222","shortcode":"ABC123"}</html>'
+
+    class FakeSession:
+        def get(self, url, timeout=None):
+            assert url == "https://www.instagram.com/p/ABC123/"
+            return FakeResponse()
+
+    crawler.session = FakeSession()
+    assert crawler.resolve_media_id_from_html("ABC123") == "222"
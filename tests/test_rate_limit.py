@@ -0,0 +1,47 @@
+import ig_crawler
+
+
+def test_rate_limit_check_spaces_requests_by_min_interval(crawler, monkeypatch):
+    clock = {"now": 100.0}
+    sleeps = []
+
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+        clock["now"] += seconds
+
+    monkeypatch.setattr(ig_crawler.time, "monotonic", lambda: clock["now"])
+    monkeypatch.setattr(ig_crawler.time, "sleep", fake_sleep)
+    crawler.requests_per_minute = 30
+    crawler.request_jitter_ratio = 0
+
+    crawler.rate_limit_check()
+    assert sleeps == []
+
+    clock["now"] += 0.5
+    crawler.rate_limit_check()
+    assert sleeps == [1.5]
+
+    clock["now"] += 5.0
+    crawler.rate_limit_check()
+    assert sleeps == [1.5]
+
+
+def test_rate_limit_check_disabled_when_rate_not_positive(crawler, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(ig_crawler.time, "sleep", sleeps.append)
+    crawler.requests_per_minute = 0
+    crawler.rate_limit_check()
+    crawler.rate_limit_check()
+    assert sleeps == []
+
+
+def test_rate_limit_check_picks_up_jitter_ratio_changes(crawler, monkeypatch):
+    monkeypatch.setattr(ig_crawler.time, "sleep", lambda seconds: None)
+    crawler.requests_per_minute = 60
+    crawler.request_jitter_ratio = 0.5
+    crawler.rate_limit_check()
+    assert crawler._jitter_max == 0.5
+
+    crawler.request_jitter_ratio = 0
+    crawler.rate_limit_check()
+    assert crawler._jitter_max == 0
@@ -1,5 +1,9 @@
 import json
 
+import pytest
+
+import json_compat
+
 
 def test_resume_state_save_load_and_clear(crawler):
     shortcode = "TESTCODE"
@@ -58,8 +62,7 @@ def test_resume_state_file_contains_expected_keys(crawler):
     required_keys = {
         "post",
         "comment_count",
-        "comments",
-        "seen_comment_ids",
+        "seen_ids_count",
         "cursor",
         "last_cursor",
         "pages",
@@ -69,3 +72,188 @@ def test_resume_state_file_contains_expected_keys(crawler):
         "updated_at",
     }
     assert required_keys.issubset(raw.keys())
+    assert crawler.resume_comments_path(shortcode).exists()
+
+
+def test_resume_state_appends_only_new_comments(crawler):
+    shortcode = "APPEND"
+    comments = [{"id": "1"}]
+    state = dict(
+        shortcode=shortcode,
+        post_info={"shortcode": shortcode},
+        seen_ids={"1"},
+        cursor="cursor-1",
+        last_cursor=None,
+        page=1,
+        expected_count=None,
+        stop_reason=None,
+        complete=False,
+    )
+    crawler.save_resume_state(comments=comments, **state)
+    comments.append({"id": "2", "replies": [{"id": "3"}]})
+    crawler.save_resume_state(comments=comments, **dict(state, page=2))
+
+    lines = crawler.resume_comments_path(shortcode).read_bytes().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["1", "2"]
+
+    loaded = crawler.load_resume_state(shortcode)
+    assert loaded["comments"] == comments
+    assert loaded["pages"] == 2
+    assert loaded["seen_comment_ids"] == {"1", "2", "3"}
+
+
+def test_resume_state_truncates_unsaved_sidecar_tail(crawler):
+    shortcode = "TORN"
+    crawler.save_resume_state(
+        shortcode=shortcode,
+        post_info={"shortcode": shortcode},
+        comments=[{"id": "1"}],
+        seen_ids={"1"},
+        cursor="cursor-1",
+        last_cursor=None,
+        page=1,
+        expected_count=None,
+        stop_reason=None,
+        complete=False,
+    )
+    sidecar = crawler.resume_comments_path(shortcode)
+    saved = sidecar.read_bytes()
+    with open(sidecar, "ab") as file:
+        file.write(b'{"id": "2"}\n{"id": "3", "te')
+
+    loaded = crawler.load_resume_state(shortcode)
+    assert loaded["comments"] == [{"id": "1"}]
+    assert sidecar.read_bytes() == saved
+
+
+def test_resume_state_complete_save_clears_files(crawler):
+    shortcode = "DONE"
+    state = dict(
+        shortcode=shortcode,
+        post_info={"shortcode": shortcode},
+        comments=[{"id": "1"}],
+        seen_ids={"1"},
+        cursor=None,
+        last_cursor=None,
+        page=1,
+        expected_count=1,
+        stop_reason=None,
+    )
+    crawler.save_resume_state(complete=False, **state)
+    crawler.save_resume_state(complete=True, **dict(state, stop_reason="no_more_pages"))
+
+    assert not crawler.resume_path(shortcode).exists()
+    assert not crawler.resume_comments_path(shortcode).exists()
+    assert crawler.load_resume_state(shortcode) is None
+
+
+def test_resume_state_skips_unchanged_save(crawler):
+    shortcode = "SAME"
+    state = dict(
+        shortcode=shortcode,
+        post_info={"shortcode": shortcode},
+        comments=[{"id": "1"}],
+        seen_ids={"1"},
+        cursor="cursor-1",
+        last_cursor=None,
+        page=1,
+        expected_count=None,
+        stop_reason=None,
+        complete=False,
+    )
+    crawler.save_resume_state(**state)
+    path = crawler.resume_path(shortcode)
+    path.write_bytes(b"{}")
+
+    crawler.save_resume_state(**state)
+    assert path.read_bytes() == b"{}"
+
+    crawler.save_resume_state(**dict(state, cursor="cursor-2", page=2))
+    assert json.loads(path.read_bytes())["cursor"] == "cursor-2"
+
+
+def test_resume_state_loads_and_migrates_inline_comments(crawler):
+    shortcode = "LEGACY"
+    comments = [{"id": "1", "replies": [{"id": "3"}]}, {"id": "2", "replies": []}]
+    path = crawler.resume_path(shortcode)
+    path.write_text(
+        json.dumps(
+            {
+                "post": {"shortcode": shortcode},
+                "comment_count": 2,
+                "comments": comments,
+                "seen_comment_ids": ["1", "2", "3"],
+                "cursor": "cursor-1",
+                "last_cursor": None,
+                "pages": 1,
+                "expected_comment_count": None,
+                "stop_reason": None,
+                "complete": False,
+            },
+            indent=2,
+        ),
+        encoding="utf-8",
+    )
+
+    loaded = crawler.load_resume_state(shortcode)
+    assert loaded["comments"] == comments
+    assert loaded["seen_comment_ids"] == {"1", "2", "3"}
+    assert loaded["cursor"] == "cursor-1"
+
+    comments.append({"id": "4", "replies": []})
+    crawler.save_resume_state(
+        shortcode=shortcode,
+        post_info=loaded["post"],
+        comments=comments,
+        seen_ids={"1", "2", "3", "4"},
+        cursor="cursor-2",
+        last_cursor="cursor-1",
+        page=2,
+        expected_count=None,
+        stop_reason=None,
+        complete=False,
+    )
+
+    assert "comments" not in json.loads(path.read_bytes())
+    lines = crawler.resume_comments_path(shortcode).read_bytes().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["1", "2", "4"]
+    assert crawler.load_resume_state(shortcode)["comments"] == comments
+
+
+def test_resume_state_resave_after_interrupted_append(crawler, monkeypatch):
+    shortcode = "INTERRUPTED"
+    comments = [{"id": str(i)} for i in range(6)]
+    state = dict(
+        shortcode=shortcode,
+        post_info={"shortcode": shortcode},
+        seen_ids=set(),
+        cursor="cursor-1",
+        last_cursor=None,
+        page=1,
+        expected_count=None,
+        stop_reason=None,
+        complete=False,
+    )
+    crawler.save_resume_state(comments=comments[:3], **state)
+
+    real_dumps = json_compat.dumps
+
+    def interrupting_dumps(obj, indent=False):
+        if isinstance(obj, dict) and obj.get("id") == "5":
+            raise KeyboardInterrupt
+        return real_dumps(obj, indent)
+
+    monkeypatch.setattr(json_compat, "dumps", interrupting_dumps)
+    with pytest.raises(KeyboardInterrupt):
+        crawler.save_resume_state(comments=comments, **dict(state, cursor="cursor-2", page=2))
+    monkeypatch.setattr(json_compat, "dumps", real_dumps)
+
+    # Comments 3 and 4 reached the sidecar before the interrupt.
+    lines = crawler.resume_comments_path(shortcode).read_bytes().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["0", "1", "2", "3", "4"]
+
+    crawler.save_resume_state(comments=comments, **dict(state, cursor="cursor-2", page=2, stop_reason="interrupted"))
+
+    lines = crawler.resume_comments_path(shortcode).read_bytes().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["0", "1", "2", "3", "4", "5"]
+    assert crawler.load_resume_state(shortcode)["comments"] == comments